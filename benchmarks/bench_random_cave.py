@@ -0,0 +1,104 @@
+"""随机抽取回声洞的基准测试
+
+对比旧实现 ``ORDER BY RANDOM() LIMIT 1`` 与内存 ID 数组 + 主键查询两种方式，
+分别在 1 万、10 万、100 万条记录下测量单次 /cq 的平均耗时。
+
+用法：python benchmarks/bench_random_cave.py [行数 ...]
+数据库建在临时目录中，运行结束后自动删除；不依赖 AstrBot。
+"""
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from array import array
+
+ROW_SIZES = [10_000, 100_000, 1_000_000]
+DELETED_RATIO = 0.1
+
+COLUMNS = "cave_id, text, sender_id, group_id, group_nick, pick_count, date, is_deleted"
+
+
+def build_db(path: str, rows: int) -> sqlite3.Connection:
+    """建一个与插件相同表结构的数据库，约 10% 的记录为已删除"""
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("""
+        CREATE TABLE cave (
+            cave_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            text TEXT NOT NULL,
+            sender_id INTEGER NOT NULL,
+            group_id INTEGER NOT NULL,
+            group_nick TEXT NOT NULL,
+            pick_count INTEGER DEFAULT 0,
+            date INTEGER NOT NULL,
+            is_deleted INTEGER DEFAULT 0
+        )
+    """)
+    conn.execute("CREATE INDEX idx_sender ON cave(sender_id)")
+    conn.execute("CREATE INDEX idx_deleted ON cave(is_deleted)")
+    rnd = random.Random(0)
+    now = int(time.time())
+    conn.executemany(
+        "INSERT INTO cave (text, sender_id, group_id, group_nick, pick_count, date, is_deleted) "
+        "VALUES (?, ?, ?, ?, 0, ?, ?)",
+        (
+            (f"回声洞测试内容 {i} " * 4, rnd.randrange(1000), rnd.randrange(50), "测试群",
+             now, 1 if rnd.random() < DELETED_RATIO else 0)
+            for i in range(rows)
+        )
+    )
+    conn.commit()
+    return conn
+
+
+def bench(func, min_seconds: float = 1.0, min_runs: int = 5) -> float:
+    """重复执行直到累计至少 min_seconds 秒，返回单次平均耗时（秒）"""
+    runs = 0
+    start = time.perf_counter()
+    while True:
+        func()
+        runs += 1
+        elapsed = time.perf_counter() - start
+        if runs >= min_runs and elapsed >= min_seconds:
+            return elapsed / runs
+
+
+def run(rows: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = build_db(os.path.join(tmp, "cave.db"), rows)
+        c = conn.cursor()
+
+        def order_by_random():
+            c.execute(f"SELECT {COLUMNS} FROM cave WHERE is_deleted = 0 ORDER BY RANDOM() LIMIT 1")
+            return c.fetchone()
+
+        load_start = time.perf_counter()
+        ids = array("q", (r[0] for r in conn.execute("SELECT cave_id FROM cave WHERE is_deleted = 0")))
+        load_time = time.perf_counter() - load_start
+
+        def id_array():
+            cave_id = ids[random.randrange(len(ids))]
+            c.execute(f"SELECT {COLUMNS} FROM cave WHERE cave_id = ?", (cave_id,))
+            return c.fetchone()
+
+        old = bench(order_by_random)
+        new = bench(id_array)
+        print(
+            f"{rows:>9} 行 | ORDER BY RANDOM(): {old * 1000:9.3f} ms | "
+            f"ID 数组 + 主键: {new * 1000:7.4f} ms | 提速 {old / new:8.0f}x | "
+            f"启动加载 {len(ids)} 个 ID 耗时 {load_time * 1000:.0f} ms"
+        )
+        conn.close()
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or ROW_SIZES
+    for rows in sizes:
+        run(rows)
+
+
+if __name__ == "__main__":
+    main()
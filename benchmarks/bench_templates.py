@@ -0,0 +1,73 @@
+"""消息模板渲染的基准测试
+
+对比旧实现（每次回复都 dict 查找 + str.format，异常时吞掉）与预编译的 MessageTemplate，
+分别测量 cave_detail、add_success 与无占位符消息的渲染吞吐量。
+
+用法：python benchmarks/bench_templates.py [每项渲染次数]
+需要在装有 AstrBot 的 Python 环境中运行（导入插件的 main.py）。
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import CavePlugin, MessageTemplate  # noqa: E402
+
+RUNS = 1_000_000
+
+MESSAGES = {
+    "cave_detail": "回声洞 #{cave_id}\n\n{text}\n\n——发布自：{group_nick}\n此回声洞已被查看{pick_count}次",
+    "add_success": "回声洞 #{cave_id} 添加成功！\n\n{quote}",
+    "cave_empty": "回声洞里空空如也...",
+}
+
+CASES = {
+    "cave_detail": dict(cave_id=123456, text="回声洞测试内容 " * 8, group_nick="测试群", pick_count=42),
+    "add_success": dict(cave_id=123456, quote="既然选择了远方，便只顾风雨兼程。——汪国真"),
+    "cave_empty": {},
+}
+
+
+def old_get_message(key: str, **kwargs) -> str:
+    """旧版 _get_message 的实现"""
+    msg = MESSAGES.get(key, "")
+    if kwargs:
+        try:
+            msg = msg.format(**kwargs)
+        except Exception:
+            pass
+    return msg
+
+
+TEMPLATES = {key: MessageTemplate(source, CavePlugin.MESSAGE_FIELDS.get(key, ())) for key, source in MESSAGES.items()}
+
+
+def new_get_message(key: str, **kwargs) -> str:
+    """新版 _get_message 的实现"""
+    template = TEMPLATES.get(key)
+    return template.render(kwargs) if template is not None else ""
+
+
+def bench(func, key: str, kwargs: dict, runs: int) -> float:
+    """返回每秒渲染次数"""
+    start = time.perf_counter()
+    for _ in range(runs):
+        func(key, **kwargs)
+    return runs / (time.perf_counter() - start)
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else RUNS
+    for key, kwargs in CASES.items():
+        assert old_get_message(key, **kwargs) == new_get_message(key, **kwargs), key
+        old = bench(old_get_message, key, kwargs, runs)
+        new = bench(new_get_message, key, kwargs, runs)
+        print(
+            f"{key:<12} | str.format: {old / 1e6:6.2f} M/s | "
+            f"预编译模板: {new / 1e6:6.2f} M/s | 提速 {new / old:4.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
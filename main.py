@@ -3,7 +3,16 @@ import random
 import time
 import asyncio
 import os
-from typing import Optional, List, Tuple
+import queue
+import string
+import threading
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from itertools import islice
+from operator import itemgetter
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Optional, List, Tuple
 from contextlib import contextmanager
 
 from astrbot.api.event import filter, AstrMessageEvent, MessageChain
@@ -12,103 +21,1005 @@ from astrbot.api import logger, AstrBotConfig
 from astrbot.api.message_components import Node, Nodes, Plain
 
 
+class LiveCaveIndex:
+    """未删除回声洞 ID 的内存索引
+
+    ID 存放在紧凑数组中，另用字典记录每个 ID 的下标，
+    添加为追加、删除为与末尾交换后弹出，随机抽取为一次下标访问，均为 O(1)。
+    """
+    
+    def __init__(self):
+        self._ids = array("q")
+        self._pos: dict = {}
+        self._lock = threading.Lock()
+    
+    def load(self, rows):
+        """用 (cave_id, pick_count) 序列重建索引"""
+        ids = array("q", (r[0] for r in rows))
+        with self._lock:
+            self._ids = ids
+            self._pos = {cave_id: i for i, cave_id in enumerate(ids)}
+    
+    def add(self, cave_id: int, pick_count: int = 0):
+        with self._lock:
+            if cave_id in self._pos:
+                return
+            self._pos[cave_id] = len(self._ids)
+            self._ids.append(cave_id)
+    
+    def remove(self, cave_id: int):
+        with self._lock:
+            i = self._pos.pop(cave_id, None)
+            if i is None:
+                return
+            last = self._ids.pop()
+            if last != cave_id:
+                self._ids[i] = last
+                self._pos[last] = i
+    
+    def bump(self, cave_id: int):
+        """均匀模式下查看次数不影响抽取概率"""
+    
+    def sample(self) -> Optional[int]:
+        """均匀随机返回一个 ID，索引为空时返回 None"""
+        with self._lock:
+            if not self._ids:
+                return None
+            return self._ids[random.randrange(len(self._ids))]
+    
+    def __len__(self) -> int:
+        return len(self._ids)
+
+
+class WeightedCaveIndex:
+    """按查看次数加权的回声洞随机索引
+
+    每条回声洞的权重为 1 / (1 + pick_count)，越少被看过的越容易被抽到。
+    权重存放在以 cave_id 为下标的树状数组（Fenwick 树）中，
+    添加、删除、查看次数加一和加权抽取都是 O(log n)，无需每次查询重建。
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset(0)
+    
+    def _reset(self, capacity: int):
+        self._capacity = capacity
+        self._weights = array("d", bytes(8 * (capacity + 1)))
+        self._tree = array("d", bytes(8 * (capacity + 1)))
+        self._size = 0
+    
+    def _rebuild(self):
+        """按当前权重以 O(n) 重建树状数组，同时消除累积的浮点误差"""
+        tree = array("d", self._weights)
+        n = self._capacity
+        for i in range(1, n + 1):
+            j = i + (i & -i)
+            if j <= n:
+                tree[j] += tree[i]
+        self._tree = tree
+    
+    def _grow(self, cave_id: int):
+        capacity = max(cave_id, self._capacity * 2, 1024)
+        self._weights.frombytes(bytes(8 * (capacity - self._capacity)))
+        self._capacity = capacity
+        self._rebuild()
+    
+    def _update(self, cave_id: int, delta: float):
+        tree = self._tree
+        n = self._capacity
+        i = cave_id
+        while i <= n:
+            tree[i] += delta
+            i += i & -i
+    
+    def load(self, rows):
+        """用 (cave_id, pick_count) 序列重建索引"""
+        rows = list(rows)
+        with self._lock:
+            self._reset(max((r[0] for r in rows), default=0))
+            for cave_id, pick_count in rows:
+                self._weights[cave_id] = 1.0 / (1 + max(0, pick_count or 0))
+            self._size = len(rows)
+            self._rebuild()
+    
+    def add(self, cave_id: int, pick_count: int = 0):
+        with self._lock:
+            if cave_id > self._capacity:
+                self._grow(cave_id)
+            if self._weights[cave_id]:
+                return
+            w = 1.0 / (1 + max(0, pick_count))
+            self._weights[cave_id] = w
+            self._update(cave_id, w)
+            self._size += 1
+    
+    def remove(self, cave_id: int):
+        with self._lock:
+            if cave_id > self._capacity or not self._weights[cave_id]:
+                return
+            self._update(cave_id, -self._weights[cave_id])
+            self._weights[cave_id] = 0.0
+            self._size -= 1
+    
+    def bump(self, cave_id: int):
+        """查看次数加一：权重由 1/(1+c) 变为 1/(2+c)，即 w / (1 + w)"""
+        with self._lock:
+            if cave_id > self._capacity:
+                return
+            w = self._weights[cave_id]
+            if not w:
+                return
+            new_w = w / (1 + w)
+            self._weights[cave_id] = new_w
+            self._update(cave_id, new_w - w)
+    
+    def sample(self) -> Optional[int]:
+        """按权重随机返回一个 ID，索引为空时返回 None"""
+        with self._lock:
+            if not self._size:
+                return None
+            tree = self._tree
+            n = self._capacity
+            # 总权重即整棵树的前缀和
+            total = 0.0
+            i = n
+            while i > 0:
+                total += tree[i]
+                i -= i & -i
+            target = random.random() * total
+            # 自顶向下找到前缀和首次超过 target 的位置
+            pos = 0
+            step = 1 << n.bit_length()
+            while step:
+                nxt = pos + step
+                if nxt <= n and tree[nxt] <= target:
+                    pos = nxt
+                    target -= tree[nxt]
+                step >>= 1
+            cave_id = pos + 1
+            if cave_id > n or not self._weights[cave_id]:
+                # 浮点误差落到了空位上，交给调用方重抽
+                return None
+            return cave_id
+    
+    def __len__(self) -> int:
+        return self._size
+
+
+class NgramIndex:
+    """纯 Python 的二元组（bigram）倒排索引，供不支持 FTS5 的 SQLite 使用
+
+    每个 bigram 对应一个按 cave_id 升序排列的 array("I") 倒排表。
+    查询时取关键词所有 bigram 的倒排表，从最短的一条开始从大到小遍历，
+    在其余倒排表中二分查找求交集，得到的只是候选，还需回表核对原文。
+    删除只记入 _deleted 集合，遍历时跳过。
+    """
+    
+    def __init__(self):
+        self._postings: dict = {}
+        self._deleted: set = set()
+        self._lock = threading.Lock()
+        # 后台构建完成前新增的记录先暂存，构建结束后再并入
+        self._backlog: List[Tuple[int, str]] = []
+        self.ready = False
+    
+    @staticmethod
+    def _grams(text: str) -> set:
+        text = text.lower()
+        return {text[i:i + 2] for i in range(len(text) - 1)}
+    
+    def _add_locked(self, cave_id: int, text: str):
+        for gram in self._grams(text):
+            posting = self._postings.get(gram)
+            if posting is None:
+                self._postings[gram] = array("I", (cave_id,))
+            elif posting[-1] < cave_id:
+                posting.append(cave_id)
+            else:
+                # 极少见：ID 不是递增到达的（如导入旧数据），按序插入并去重
+                i = bisect_left(posting, cave_id)
+                if i == len(posting) or posting[i] != cave_id:
+                    posting.insert(i, cave_id)
+    
+    def build(self, rows):
+        """由 (cave_id, text) 序列构建索引，在后台线程中调用"""
+        count = 0
+        for cave_id, text in rows:
+            with self._lock:
+                self._add_locked(cave_id, text)
+            count += 1
+        with self._lock:
+            for cave_id, text in self._backlog:
+                self._add_locked(cave_id, text)
+            self._backlog = []
+            self.ready = True
+        logger.info(f"回声洞 bigram 索引构建完成，共 {count} 条记录，{len(self._postings)} 个 bigram")
+    
+    def add(self, cave_id: int, text: str):
+        with self._lock:
+            if self.ready:
+                self._add_locked(cave_id, text)
+            else:
+                self._backlog.append((cave_id, text))
+    
+    def remove(self, cave_id: int):
+        with self._lock:
+            self._deleted.add(cave_id)
+    
+    def candidates(self, keyword: str):
+        """按 cave_id 从大到小返回可能包含关键词的 ID
+
+        索引尚未就绪或关键词不足 2 个字符时返回 None，由调用方退回 LIKE 扫描。
+        """
+        grams = self._grams(keyword)
+        if not self.ready or not grams:
+            return None
+        with self._lock:
+            lists = [self._postings.get(g) for g in grams]
+            if any(p is None for p in lists):
+                return iter(())
+            lists.sort(key=len)
+            # 写线程可能在遍历期间按序插入（导入时 ID 乱序到达），元素移位会导致漏读或重复，
+            # 因此在锁内复制最短的那条；其余倒排表只做二分查找，单次调用在 GIL 下不会被插入打断
+            base = array("I", lists[0])
+        return self._intersect(base, lists[1:])
+    
+    def _intersect(self, base, others):
+        deleted = self._deleted
+        for i in range(len(base) - 1, -1, -1):
+            cave_id = base[i]
+            if cave_id in deleted:
+                continue
+            for posting in others:
+                j = bisect_left(posting, cave_id)
+                if j == len(posting) or posting[j] != cave_id:
+                    break
+            else:
+                yield cave_id
+
+
 class CaveDatabase:
-    """回声洞数据库管理类"""
+    """回声洞数据库管理类
+
+    持有一个长连接池：单个写连接加若干读连接，数据库运行在 WAL 模式下，读写互不阻塞。
+    所有写操作都投递到写线程的队列中，由写线程批量执行并在同一个事务中提交（组提交），
+    调用方通过 Future 拿到各自的结果。
+    查看次数采用延迟写回：增量先累积在内存中，按时间间隔或数量阈值批量写入，
+    读取时把尚未写回的增量合并进结果，显示的次数保持精确。
+    随机抽取由内存中的 LiveCaveIndex（均匀）或 WeightedCaveIndex（按查看次数加权）完成，
+    再按主键读取整行。
+    SQLite 支持 FTS5 时，未删除回声洞的正文同步到 trigram 分词的全文索引 cave_fts 中，
+    搜索不再全表 LIKE 扫描；不支持时在后台构建内存中的 NgramIndex 作为替代。
+    群名称单独存放在 groups 表中并常驻内存，cave 表只保存 group_id，
+    返回给调用方的行仍按 (cave_id, text, sender_id, group_id, group_nick, pick_count, date, is_deleted) 组装。
+    get_cave 带有按 cave_id 的 LRU 行缓存，删除时失效，查看次数写回提交时同步到缓存中的行。
+    搜索结果按关键词缓存有序的 ID 列表，缓存项记录写入代数，增删回声洞后代数变化即视为过期。
+    """
+    
+    UNKNOWN_GROUP_NICK = "未知群聊"
+    ROW_COLUMNS = "cave_id, text, sender_id, group_id, pick_count, date, is_deleted"
     
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, read_pool_size: int = 4, cache_size_kb: int = 16384,
+                 mmap_size: int = 268435456, busy_timeout_ms: int = 10000, write_batch_size: int = 128,
+                 pick_flush_interval: float = 5.0, pick_flush_threshold: int = 1000,
+                 random_mode: str = "uniform", row_cache_size: int = 1024,
+                 search_cache_size: int = 128, search_cache_ttl: float = 300.0):
         self.db_path = db_path
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size = mmap_size
+        self.busy_timeout_ms = busy_timeout_ms
+        self.write_batch_size = max(1, write_batch_size)
+        self.pick_flush_interval = max(0.1, pick_flush_interval)
+        self.pick_flush_threshold = max(1, pick_flush_threshold)
+        self._closed = False
+        self.fts_enabled = False
+        
+        # 查看次数写回缓冲：pending 为尚未写入的增量，flushing 为已写入但事务尚未提交的增量
+        # _picks_lock 只保护字典的读写，执行 SQL 时从不持有
+        self._picks_lock = threading.Lock()
+        self._pending_picks: dict = {}
+        self._flushing_picks: dict = {}
+        self._flush_requested = False
+        # 写回序号：带查看次数增量或需要淘汰缓存行的事务提交前后各加一，奇数表示提交进行中。
+        # 读取方在查询前后比较序号，未变化才说明查询结果与缓冲、行缓存处于同一状态，可以安全合并
+        self._flush_seq = 0
+        self._flush_done = threading.Condition(self._picks_lock)
+        
+        # get_cave 行缓存：cave_id -> cave 表中的原始行，与查看次数缓冲共用 _picks_lock，按写回序号与查询结果对齐
+        self.row_cache_size = max(0, row_cache_size)
+        self._row_cache: "OrderedDict[int, Tuple]" = OrderedDict()
+        self._row_cache_hits = 0
+        self._row_cache_misses = 0
+        
+        # 搜索结果缓存：关键词 -> (写入代数, 过期时间, 查询上限, ID 数组)
+        self.search_cache_size = max(0, search_cache_size)
+        self.search_cache_ttl = search_cache_ttl
+        self._search_lock = threading.Lock()
+        self._search_cache: "OrderedDict[str, Tuple[int, float, int, array]]" = OrderedDict()
+        # 写入代数：添加、删除、导入提交后递增
+        self._write_generation = 0
+        self._search_hits = 0
+        self._search_misses = 0
+        self._search_stale = 0
+        
+        # 写线程中登记的提交后回调，用于在事务成功后同步内存索引
+        self._after_commit: List[Callable[[], None]] = []
+        # 本批事务提交后要从行缓存淘汰的 cave_id，与查看次数增量一起在 _finish_flush 中处理
+        self._evictions: List[int] = []
+        self._live = WeightedCaveIndex() if random_mode == "weighted" else LiveCaveIndex()
+        self._ngram: Optional[NgramIndex] = None
+        # group_id -> 群名称，启动时从 groups 表加载，只在写线程提交后更新
+        self._group_nicks: dict = {}
+        
+        # mycave 翻页锚点：(sender_id, 每页条数) -> 各页最后一条的 cave_id，LRU 淘汰
+        self._anchors_lock = threading.Lock()
+        self._page_anchors: "OrderedDict[Tuple[int, int], List[int]]" = OrderedDict()
+        self._anchors_generation = 0
+        
+        # 写连接：自动提交模式，事务由写线程显式控制
+        self._write_lock = threading.Lock()
+        self._writer = self._connect()
+        self._writer.isolation_level = None
         self._init_db()
+        
+        # 读连接池
+        self._readers: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        for _ in range(max(1, read_pool_size)):
+            self._readers.put(self._connect())
+        self._load_group_nicks()
+        self._load_live_index()
+        if not self.fts_enabled:
+            self._ngram = NgramIndex()
+            threading.Thread(target=self._build_ngram_index, name="cave-db-ngram", daemon=True).start()
+        
+        # 写线程；_submit_lock 保证关闭哨兵之后不会再有写操作入队
+        self._submit_lock = threading.Lock()
+        self._write_queue: "queue.Queue[Optional[Tuple]]" = queue.Queue()
+        self._writer_thread = threading.Thread(
+            target=self._writer_loop,
+            name="cave-db-writer",
+            daemon=True
+        )
+        self._writer_thread.start()
+    
+    def _connect(self) -> sqlite3.Connection:
+        """创建一个已调优的数据库连接"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False
+        )
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        # 负数表示以 KiB 为单位
+        conn.execute(f"PRAGMA cache_size = {-int(self.cache_size_kb)}")
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        return conn
     
     def _init_db(self):
-        """初始化数据库表结构"""
+        """初始化数据库：执行尚未应用的迁移步骤，再初始化全文索引"""
         try:
-            with self._get_conn() as conn:
+            with self._write_conn() as conn:
                 c = conn.cursor()
-                # 主表：使用 AUTOINCREMENT 确保 ID 唯一且递增
-                c.execute("""
-                    CREATE TABLE IF NOT EXISTS cave (
-                        cave_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        text TEXT NOT NULL,
-                        sender_id INTEGER NOT NULL,
-                        group_id INTEGER NOT NULL,
-                        group_nick TEXT NOT NULL,
-                        pick_count INTEGER DEFAULT 0,
-                        date INTEGER NOT NULL,
-                        is_deleted INTEGER DEFAULT 0
-                    )
-                """)
-                # 创建索引提升查询性能
-                c.execute("CREATE INDEX IF NOT EXISTS idx_sender ON cave(sender_id)")
-                c.execute("CREATE INDEX IF NOT EXISTS idx_deleted ON cave(is_deleted)")
-                conn.commit()
+                self._migrate(c)
+                self._init_fts(c)
                 logger.info("回声洞数据库初始化完成")
         except Exception as e:
             logger.error(f"数据库初始化失败: {e}")
             raise
     
+    def _migrate(self, c: sqlite3.Cursor):
+        """按 PRAGMA user_version 记录的版本号依次执行迁移
+
+        每一步连同版本号的更新在同一个事务中提交，中途失败时回滚，下次启动从失败的那一步重试。
+        """
+        c.execute("PRAGMA user_version")
+        version = c.fetchone()[0]
+        if version > len(self.MIGRATIONS):
+            logger.warning(f"数据库版本 {version} 高于插件支持的版本 {len(self.MIGRATIONS)}，跳过迁移")
+            return
+        for target in range(version + 1, len(self.MIGRATIONS) + 1):
+            step = self.MIGRATIONS[target - 1]
+            c.execute("BEGIN IMMEDIATE")
+            try:
+                step(self, c)
+                c.execute(f"PRAGMA user_version = {target}")
+                c.execute("COMMIT")
+            except Exception:
+                c.execute("ROLLBACK")
+                logger.error(f"数据库迁移到版本 {target} 失败")
+                raise
+            logger.info(f"数据库已迁移到版本 {target}：{step.__doc__.strip().splitlines()[0]}")
+    
+    def _migration_1(self, c: sqlite3.Cursor):
+        """创建主表"""
+        # 主表：使用 AUTOINCREMENT 确保 ID 唯一且递增
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS cave (
+                cave_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                text TEXT NOT NULL,
+                sender_id INTEGER NOT NULL,
+                group_id INTEGER NOT NULL,
+                group_nick TEXT NOT NULL,
+                pick_count INTEGER DEFAULT 0,
+                date INTEGER NOT NULL,
+                is_deleted INTEGER DEFAULT 0
+            )
+        """)
+        c.execute("CREATE INDEX IF NOT EXISTS idx_sender ON cave(sender_id)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_deleted ON cave(is_deleted)")
+    
+    def _migration_2(self, c: sqlite3.Cursor):
+        """创建计数表及维护触发器
+
+        cave_stats 按 (scope, key) 保存未删除回声洞的数量：全局（key 为 0）、按发送者、按群。
+        计数由插入与 is_deleted 变化的触发器在同一事务内维护，查询总数时无需 COUNT(*)。
+        """
+        c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'cave_stats'")
+        is_new = c.fetchone() is None
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS cave_stats (
+                scope TEXT NOT NULL,
+                key INTEGER NOT NULL,
+                live_count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (scope, key)
+            ) WITHOUT ROWID
+        """)
+        if is_new:
+            # 为已有数据补建计数
+            c.execute(
+                "INSERT INTO cave_stats (scope, key, live_count) "
+                "SELECT 'global', 0, COUNT(*) FROM cave WHERE is_deleted = 0"
+            )
+            c.execute(
+                "INSERT INTO cave_stats (scope, key, live_count) "
+                "SELECT 'sender', sender_id, COUNT(*) FROM cave WHERE is_deleted = 0 GROUP BY sender_id"
+            )
+            c.execute(
+                "INSERT INTO cave_stats (scope, key, live_count) "
+                "SELECT 'group', group_id, COUNT(*) FROM cave WHERE is_deleted = 0 GROUP BY group_id"
+            )
+        self._create_stats_triggers(c)
+    
+    @staticmethod
+    def _create_stats_triggers(c: sqlite3.Cursor):
+        c.execute("""
+            CREATE TRIGGER IF NOT EXISTS cave_stats_ai AFTER INSERT ON cave
+            WHEN new.is_deleted = 0 BEGIN
+                INSERT INTO cave_stats (scope, key, live_count) VALUES
+                    ('global', 0, 1), ('sender', new.sender_id, 1), ('group', new.group_id, 1)
+                ON CONFLICT (scope, key) DO UPDATE SET live_count = live_count + excluded.live_count;
+            END
+        """)
+        c.execute("""
+            CREATE TRIGGER IF NOT EXISTS cave_stats_au AFTER UPDATE OF is_deleted ON cave
+            WHEN (old.is_deleted = 0) != (new.is_deleted = 0) BEGIN
+                INSERT INTO cave_stats (scope, key, live_count)
+                SELECT scope, key, CASE WHEN new.is_deleted = 0 THEN 1 ELSE -1 END
+                FROM (SELECT 'global' AS scope, 0 AS key
+                      UNION ALL SELECT 'sender', new.sender_id
+                      UNION ALL SELECT 'group', new.group_id)
+                WHERE true
+                ON CONFLICT (scope, key) DO UPDATE SET live_count = live_count + excluded.live_count;
+            END
+        """)
+    
+    def _migration_3(self, c: sqlite3.Cursor):
+        """创建部分覆盖索引
+
+        只索引未删除的记录，查询条件中带 is_deleted = 0 时可以直接在索引内完成：
+        idx_cave_sender_live 覆盖 mycave 的锚点与分页，idx_cave_live 覆盖启动时随机索引的加载，
+        LIKE 搜索也借助它按 cave_id 倒序只遍历未删除的记录。
+        """
+        # 索引列中带上 is_deleted，查询规划器才会把它当作覆盖索引，不再回表
+        c.execute(
+            "CREATE INDEX IF NOT EXISTS idx_cave_sender_live "
+            "ON cave(sender_id, cave_id, is_deleted) WHERE is_deleted = 0"
+        )
+        c.execute(
+            "CREATE INDEX IF NOT EXISTS idx_cave_live "
+            "ON cave(cave_id, pick_count, is_deleted) WHERE is_deleted = 0"
+        )
+    
+    def _migration_4(self, c: sqlite3.Cursor):
+        """移除被部分索引取代的旧索引并更新统计信息"""
+        # is_deleted 只有两个取值，单列索引几乎没有选择性；idx_sender 已被 idx_cave_sender_live 取代
+        c.execute("DROP INDEX IF EXISTS idx_deleted")
+        c.execute("DROP INDEX IF EXISTS idx_sender")
+        c.execute("ANALYZE")
+    
+    def _migration_5(self, c: sqlite3.Cursor):
+        """拆分群名称到 groups 表
+
+        每个群取最近一条非占位名称的记录作为当前名称，随后重建 cave 表去掉 group_nick 列。
+        重建会连带删除 cave 上的触发器与索引，这里重新创建；全文索引的触发器由 _init_fts 补建。
+        """
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS groups (
+                group_id INTEGER PRIMARY KEY,
+                nick TEXT NOT NULL,
+                updated_at INTEGER NOT NULL
+            )
+        """)
+        # 聚合查询中与 MAX() 同列出现的裸列取自 cave_id 最大的那一行
+        c.execute(
+            "INSERT OR IGNORE INTO groups (group_id, nick, updated_at) "
+            "SELECT group_id, group_nick, date FROM ("
+            "  SELECT group_id, group_nick, date, MAX(cave_id) FROM cave "
+            "  WHERE group_nick != ? GROUP BY group_id"
+            ")",
+            (self.UNKNOWN_GROUP_NICK,)
+        )
+        c.execute(
+            "INSERT OR IGNORE INTO groups (group_id, nick, updated_at) "
+            "SELECT group_id, ?, MAX(date) FROM cave GROUP BY group_id",
+            (self.UNKNOWN_GROUP_NICK,)
+        )
+        c.execute("""
+            CREATE TABLE cave_new (
+                cave_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                text TEXT NOT NULL,
+                sender_id INTEGER NOT NULL,
+                group_id INTEGER NOT NULL,
+                pick_count INTEGER DEFAULT 0,
+                date INTEGER NOT NULL,
+                is_deleted INTEGER DEFAULT 0
+            )
+        """)
+        c.execute(f"INSERT INTO cave_new ({self.ROW_COLUMNS}) SELECT {self.ROW_COLUMNS} FROM cave")
+        c.execute("DROP TABLE cave")
+        c.execute("ALTER TABLE cave_new RENAME TO cave")
+        self._create_stats_triggers(c)
+        self._migration_3(c)
+        c.execute("ANALYZE")
+    
+    MIGRATIONS = [_migration_1, _migration_2, _migration_3, _migration_4, _migration_5]
+    
+    STAT_GLOBAL = "global"
+    STAT_SENDER = "sender"
+    STAT_GROUP = "group"
+    
+    @staticmethod
+    def _stat(c: sqlite3.Cursor, scope: str, key: int) -> int:
+        c.execute("SELECT live_count FROM cave_stats WHERE scope = ? AND key = ?", (scope, key))
+        row = c.fetchone()
+        return row[0] if row else 0
+    
+    def get_live_count(self, scope: str = STAT_GLOBAL, key: int = 0) -> int:
+        """读取未删除回声洞数量：全局、指定发送者或指定群"""
+        try:
+            with self._read_conn() as conn:
+                return self._stat(conn.cursor(), scope, key)
+        except Exception as e:
+            logger.error(f"查询回声洞数量失败: {e}")
+            return 0
+    
+    @staticmethod
+    def _fts_available() -> bool:
+        """检测当前 SQLite 是否支持 FTS5 及 trigram 分词器"""
+        probe = sqlite3.connect(":memory:")
+        try:
+            probe.execute("CREATE VIRTUAL TABLE t USING fts5(x, tokenize = 'trigram')")
+            return True
+        except sqlite3.OperationalError:
+            return False
+        finally:
+            probe.close()
+    
+    def _init_fts(self, c: sqlite3.Cursor):
+        """创建全文索引及同步触发器，并为已有数据补建索引
+
+        全文索引以 cave 为外部内容表，不重复存储正文；插入时写入索引，软删除时移出索引。
+        SQLite 不支持 FTS5 时删除同步触发器，避免写入失败，搜索退回 LIKE。
+        """
+        c.execute("SELECT name FROM sqlite_master WHERE name IN ('cave_fts', 'cave_fts_ai', 'cave_fts_ad')")
+        existing = {r[0] for r in c.fetchall()}
+        if not self._fts_available():
+            c.execute("DROP TRIGGER IF EXISTS cave_fts_ai")
+            c.execute("DROP TRIGGER IF EXISTS cave_fts_ad")
+            logger.warning("当前 SQLite 不支持 FTS5 trigram 分词器，搜索将使用 LIKE 扫描")
+            return
+        
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            if "cave_fts" not in existing:
+                c.execute(
+                    "CREATE VIRTUAL TABLE cave_fts USING fts5("
+                    "text, content = 'cave', content_rowid = 'cave_id', tokenize = 'trigram')"
+                )
+            if existing != {"cave_fts", "cave_fts_ai", "cave_fts_ad"}:
+                # 新建索引，或触发器曾被移除导致索引过期：清空后按未删除记录重建
+                c.execute("INSERT INTO cave_fts(cave_fts) VALUES ('delete-all')")
+                c.execute(
+                    "INSERT INTO cave_fts(rowid, text) SELECT cave_id, text FROM cave WHERE is_deleted = 0"
+                )
+                logger.info("回声洞全文索引已重建")
+            c.execute("""
+                CREATE TRIGGER IF NOT EXISTS cave_fts_ai AFTER INSERT ON cave
+                WHEN new.is_deleted = 0 BEGIN
+                    INSERT INTO cave_fts(rowid, text) VALUES (new.cave_id, new.text);
+                END
+            """)
+            c.execute("""
+                CREATE TRIGGER IF NOT EXISTS cave_fts_ad AFTER UPDATE OF is_deleted ON cave
+                WHEN old.is_deleted = 0 AND new.is_deleted = 1 BEGIN
+                    INSERT INTO cave_fts(cave_fts, rowid, text) VALUES ('delete', old.cave_id, old.text);
+                END
+            """)
+            c.execute("COMMIT")
+        except Exception:
+            c.execute("ROLLBACK")
+            raise
+        self.fts_enabled = True
+    
     @contextmanager
-    def _get_conn(self):
-        """获取数据库连接的上下文管理器"""
-        conn = sqlite3.connect(self.db_path, timeout=10.0)
+    def _write_conn(self):
+        """获取写连接的上下文管理器，异常时回滚未提交的事务"""
+        if self._closed:
+            raise sqlite3.ProgrammingError("数据库连接池已关闭")
+        with self._write_lock:
+            try:
+                yield self._writer
+            except Exception:
+                self._writer.rollback()
+                raise
+    
+    @contextmanager
+    def _read_conn(self):
+        """从连接池借出一个读连接，用完归还"""
+        if self._closed:
+            raise sqlite3.ProgrammingError("数据库连接池已关闭")
+        conn = self._readers.get(timeout=self.busy_timeout_ms / 1000)
         try:
             yield conn
         finally:
-            conn.close()
+            self._readers.put(conn)
     
-    def add_cave(self, sender_id: int, group_id: int, group_nick: str, content: str) -> Optional[int]:
-        """添加回声洞记录"""
+    def _load_group_nicks(self):
+        """从 groups 表加载全部群名称"""
+        with self._read_conn() as conn:
+            self._group_nicks = dict(conn.execute("SELECT group_id, nick FROM groups"))
+        logger.info(f"已加载 {len(self._group_nicks)} 个群的名称")
+    
+    def _row(self, row: Optional[Tuple]) -> Optional[Tuple]:
+        """把 cave 表的一行补上群名称，组装成对外的行格式"""
+        if row is None:
+            return None
+        return row[:4] + (self._group_nicks.get(row[3], self.UNKNOWN_GROUP_NICK),) + row[4:]
+    
+    def _load_live_index(self):
+        """从数据库加载所有未删除的回声洞 ID"""
+        with self._read_conn() as conn:
+            c = conn.cursor()
+            c.execute("SELECT cave_id, pick_count FROM cave WHERE is_deleted = 0")
+            self._live.load(c)
+        logger.info(f"已加载 {len(self._live)} 条回声洞索引")
+    
+    def _build_ngram_index(self):
+        """后台线程：流式读取未删除的回声洞构建 bigram 索引"""
         try:
-            timestamp = int(time.time())
-            with self._get_conn() as conn:
+            with self._read_conn() as conn:
                 c = conn.cursor()
-                c.execute(
-                    "INSERT INTO cave (text, sender_id, group_id, group_nick, pick_count, date, is_deleted) "
-                    "VALUES (?, ?, ?, ?, 0, ?, 0)",
-                    (content, sender_id, group_id, group_nick, timestamp)
-                )
-                conn.commit()
-                return c.lastrowid
+                c.execute("SELECT cave_id, text FROM cave WHERE is_deleted = 0 ORDER BY cave_id")
+                self._ngram.build(c)
         except Exception as e:
-            logger.error(f"添加回声洞失败: {e}")
+            logger.error(f"构建 bigram 索引失败，搜索将使用 LIKE 扫描: {e}")
+    
+    def _submit_write(self, op: Callable[..., Any], args: tuple, default: Any, error: str) -> Future:
+        """把写操作投递给写线程
+
+        op 在写线程中以 op(cursor, *args) 的形式执行；执行失败时记录日志，
+        Future 以 default 作为结果，调用方无需处理异常。
+        """
+        item = (op, args, default, error, Future())
+        with self._submit_lock:
+            if not self._closed:
+                self._write_queue.put(item)
+                return item[4]
+        logger.error(f"{error}: 数据库连接池已关闭")
+        item[4].set_result(default)
+        return item[4]
+    
+    def _writer_loop(self):
+        """写线程主循环：取出队列中积压的写操作，合并为一个事务提交
+
+        到达写回间隔或收到关闭哨兵时，顺带把查看次数缓冲写回。
+        """
+        next_flush = time.monotonic() + self.pick_flush_interval
+        while True:
+            batch = []
+            stop = False
+            try:
+                item = self._write_queue.get(timeout=max(0.0, next_flush - time.monotonic()))
+                if item is None:
+                    stop = True
+                else:
+                    batch.append(item)
+            except queue.Empty:
+                pass
+            while not stop and batch and len(batch) < self.write_batch_size:
+                try:
+                    item = self._write_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            if stop or time.monotonic() >= next_flush:
+                next_flush = time.monotonic() + self.pick_flush_interval
+                if self._pending_picks:
+                    batch.append((self._op_flush_picks, (), False, "写回查看次数失败", Future()))
+            if batch:
+                self._run_write_batch(batch)
+            if stop:
+                return
+    
+    def _run_write_batch(self, batch: List[Tuple]):
+        """在一个事务中执行一批写操作，每个操作用保存点隔离，单个失败不影响其他操作"""
+        results = []
+        with self._write_lock:
+            conn = self._writer
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                for op, args, default, error, fut in batch:
+                    if not fut.set_running_or_notify_cancel():
+                        continue
+                    c = conn.cursor()
+                    c.execute("SAVEPOINT cave_write")
+                    # 回滚到保存点时，该操作登记的提交后回调与缓存淘汰一并丢弃
+                    mark = len(self._after_commit)
+                    evict_mark = len(self._evictions)
+                    try:
+                        result = op(c, *args)
+                        c.execute("RELEASE cave_write")
+                    except Exception as e:
+                        c.execute("ROLLBACK TO cave_write")
+                        c.execute("RELEASE cave_write")
+                        del self._after_commit[mark:]
+                        del self._evictions[evict_mark:]
+                        logger.error(f"{error}: {e}")
+                        result = default
+                    results.append((fut, result))
+                # 提交本身不持锁；序号的变化让提交期间开始的读取重新查询，不会把同一批增量算两次
+                self._begin_commit()
+                conn.execute("COMMIT")
+                self._finish_flush()
+                for callback in self._after_commit:
+                    callback()
+            except Exception as e:
+                logger.error(f"批量写入提交失败: {e}")
+                if conn.in_transaction:
+                    conn.rollback()
+                self._restore_picks(self._flushing_picks)
+                started = {id(fut) for fut, _ in results}
+                results = [(fut, default) for _, _, default, _, fut in batch if id(fut) in started]
+                # 还没来得及执行的操作同样以失败结束
+                for _, _, default, _, fut in batch:
+                    if id(fut) not in started and fut.set_running_or_notify_cancel():
+                        results.append((fut, default))
+            finally:
+                self._after_commit = []
+                self._evictions = []
+                self._end_commit()
+        # 事务提交后再通知调用方，保证拿到结果时数据已经落盘
+        for fut, result in results:
+            fut.set_result(result)
+    
+    def close(self):
+        """停止写线程并关闭连接池中的所有连接"""
+        with self._submit_lock:
+            if self._closed:
+                return
+            self._closed = True
+            # 哨兵排在已投递的写操作之后，写线程会先处理完积压再退出
+            self._write_queue.put(None)
+        self._writer_thread.join()
+        with self._write_lock:
+            try:
+                # 截断 WAL 文件，避免卸载后残留大文件
+                self._writer.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            except Exception as e:
+                logger.warning(f"WAL 检查点失败: {e}")
+            self._writer.close()
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+        logger.info("回声洞数据库连接池已关闭")
+    
+    def _op_add_cave(self, c: sqlite3.Cursor, sender_id: int, group_id: int, group_nick: str, content: str) -> int:
+        self._op_update_group_nicks(c, {group_id: group_nick})
+        c.execute(
+            "INSERT INTO cave (text, sender_id, group_id, pick_count, date, is_deleted) "
+            "VALUES (?, ?, ?, 0, ?, 0)",
+            (content, sender_id, group_id, int(time.time()))
+        )
+        cave_id = c.lastrowid
+        self._after_commit.append(self._bump_generation)
+        self._after_commit.append(lambda: self._live.add(cave_id))
+        self._after_commit.append(lambda: self._invalidate_anchors(sender_id))
+        if self._ngram is not None:
+            self._after_commit.append(lambda: self._ngram.add(cave_id, content))
+        return cave_id
+    
+    def add_cave_nowait(self, sender_id: int, group_id: int, group_nick: str, content: str) -> Future:
+        """投递添加回声洞操作，Future 的结果为新记录的 ID，失败时为 None"""
+        return self._submit_write(
+            self._op_add_cave, (sender_id, group_id, group_nick, content), None, "添加回声洞失败"
+        )
+    
+    def add_cave(self, sender_id: int, group_id: int, group_nick: str, content: str) -> Optional[int]:
+        """添加回声洞记录"""
+        return self.add_cave_nowait(sender_id, group_id, group_nick, content).result()
+    
+    def get_cached_cave(self, cave_id: int, blocking: bool = True) -> Optional[Tuple]:
+        """只查行缓存，不访问数据库；未命中时返回 None
+
+        blocking 为 False 时锁正被占用也直接返回 None，供事件循环调用，由调用方改走数据库线程。
+        """
+        if not self._picks_lock.acquire(blocking):
             return None
+        try:
+            row = self._row_cache.get(cave_id)
+            if row is None:
+                return None
+            self._row_cache.move_to_end(cave_id)
+            self._row_cache_hits += 1
+            return self._merge_picks(self._row(row))
+        finally:
+            self._picks_lock.release()
+    
+    def _read_merged(self, query: Callable[[], Any], merge: Callable[[Any], Any]) -> Any:
+        """不持锁执行 query()，再在锁内用 merge() 把结果与查看次数缓冲合并
+
+        查询前记下写回序号（提交进行中时先等待其结束），查询后序号未变才合并；
+        否则说明期间有增量落盘或缓存行被淘汰，查询结果与缓冲不一致，重新查询。
+        只有查询期间恰好提交了查看次数写回或删除才会重试，普通的添加、导入与群名称写入不影响读取。
+        """
+        while True:
+            with self._picks_lock:
+                while self._flush_seq & 1:
+                    self._flush_done.wait()
+                seq = self._flush_seq
+            result = query()
+            with self._picks_lock:
+                if self._flush_seq == seq:
+                    return merge(result)
     
     def get_cave(self, cave_id: int) -> Optional[Tuple]:
-        """获取指定 ID 的回声洞"""
+        """获取指定 ID 的回声洞（先查行缓存）"""
+        cached = self.get_cached_cave(cave_id)
+        if cached is not None:
+            return cached
         try:
-            with self._get_conn() as conn:
+            with self._read_conn() as conn:
                 c = conn.cursor()
-                c.execute(
-                    "SELECT cave_id, text, sender_id, group_id, group_nick, pick_count, date, is_deleted "
-                    "FROM cave WHERE cave_id = ?",
-                    (cave_id,)
-                )
-                return c.fetchone()
+                
+                def query():
+                    c.execute(f"SELECT {self.ROW_COLUMNS} FROM cave WHERE cave_id = ?", (cave_id,))
+                    return c.fetchone()
+                
+                def merge(row):
+                    self._row_cache_misses += 1
+                    if row is not None and self.row_cache_size:
+                        self._row_cache[cave_id] = row
+                        self._row_cache.move_to_end(cave_id)
+                        while len(self._row_cache) > self.row_cache_size:
+                            self._row_cache.popitem(last=False)
+                    return self._merge_picks(self._row(row))
+                
+                return self._read_merged(query, merge)
         except Exception as e:
             logger.error(f"查询回声洞失败: {e}")
             return None
     
+    def _begin_commit(self):
+        """事务带有查看次数增量或需要淘汰缓存行时，把写回序号置为奇数"""
+        with self._picks_lock:
+            if self._flushing_picks or self._evictions:
+                self._flush_seq += 1
+    
+    def _finish_flush(self):
+        """提交后把已落盘的增量加到缓存的行上、淘汰被删除的行，并清空 flushing"""
+        with self._picks_lock:
+            for cave_id, delta in self._flushing_picks.items():
+                row = self._row_cache.get(cave_id)
+                if row is not None:
+                    self._row_cache[cave_id] = row[:4] + (row[4] + delta,) + row[5:]
+            self._flushing_picks = {}
+            for cave_id in self._evictions:
+                self._row_cache.pop(cave_id, None)
+    
+    def _end_commit(self):
+        """提交及其回调结束后把写回序号恢复为偶数，唤醒等待的读取方"""
+        with self._picks_lock:
+            if self._flush_seq & 1:
+                self._flush_seq += 1
+                self._flush_done.notify_all()
+    
+    def row_cache_metrics(self) -> dict:
+        with self._picks_lock:
+            lookups = self._row_cache_hits + self._row_cache_misses
+            return {
+                "size": len(self._row_cache),
+                "hits": self._row_cache_hits,
+                "misses": self._row_cache_misses,
+                "hit_ratio": self._row_cache_hits / lookups if lookups else 0.0,
+            }
+    
     def increment_pick_count(self, cave_id: int) -> bool:
-        """增加回声洞查看次数"""
+        """增加回声洞查看次数（先记入内存缓冲，稍后批量写回）"""
+        with self._picks_lock:
+            self._pending_picks[cave_id] = self._pending_picks.get(cave_id, 0) + 1
+            need_flush = len(self._pending_picks) >= self.pick_flush_threshold and not self._flush_requested
+            if need_flush:
+                self._flush_requested = True
+        if need_flush:
+            self._submit_write(self._op_flush_picks, (), False, "写回查看次数失败")
+        self._live.bump(cave_id)
+        return True
+    
+    def _op_flush_picks(self, c: sqlite3.Cursor) -> bool:
+        """把缓冲中的查看次数增量一次性写入数据库（在写线程中执行）"""
+        with self._picks_lock:
+            pending, self._pending_picks = self._pending_picks, {}
+            self._flush_requested = False
+            for cave_id, delta in pending.items():
+                self._flushing_picks[cave_id] = self._flushing_picks.get(cave_id, 0) + delta
+        if not pending:
+            return True
         try:
-            with self._get_conn() as conn:
-                c = conn.cursor()
-                c.execute("UPDATE cave SET pick_count = pick_count + 1 WHERE cave_id = ?", (cave_id,))
-                conn.commit()
-                return True
-        except Exception as e:
-            logger.error(f"更新查看次数失败: {e}")
-            return False
+            c.executemany(
+                "UPDATE cave SET pick_count = pick_count + ? WHERE cave_id = ?",
+                [(delta, cave_id) for cave_id, delta in pending.items()]
+            )
+        except Exception:
+            self._restore_picks(pending)
+            raise
+        return True
+    
+    def _restore_picks(self, deltas: dict):
+        """写回失败时把增量从 flushing 退回 pending，等待下次写回"""
+        with self._picks_lock:
+            for cave_id, delta in list(deltas.items()):
+                left = self._flushing_picks.get(cave_id, 0) - delta
+                if left > 0:
+                    self._flushing_picks[cave_id] = left
+                else:
+                    self._flushing_picks.pop(cave_id, None)
+                self._pending_picks[cave_id] = self._pending_picks.get(cave_id, 0) + delta
+    
+    def _merge_picks(self, row: Optional[Tuple]) -> Optional[Tuple]:
+        """把尚未写回的查看次数合并进查询结果"""
+        if row is None:
+            return None
+        delta = self._pending_picks.get(row[0], 0) + self._flushing_picks.get(row[0], 0)
+        if not delta:
+            return row
+        return row[:5] + (row[5] + delta,) + row[6:]
     
     def get_random_cave(self) -> Optional[Tuple]:
-        """随机获取一条未删除的回声洞"""
+        """随机获取一条未删除的回声洞
+
+        先从内存索引中抽取 ID（均匀模式 O(1)，加权模式 O(log n)），再按主键读取；
+        抽到刚被删除的记录时从索引中移除并重抽。
+        """
         try:
-            with self._get_conn() as conn:
-                c = conn.cursor()
-                c.execute(
-                    "SELECT cave_id, text, sender_id, group_id, group_nick, pick_count, date, is_deleted "
-                    "FROM cave WHERE is_deleted = 0 ORDER BY RANDOM() LIMIT 1"
-                )
-                return c.fetchone()
+            for _ in range(8):
+                if not len(self._live):
+                    return None
+                cave_id = self._live.sample()
+                if cave_id is None:
+                    continue
+                row = self.get_cave(cave_id)
+                if row is not None and row[7] == 0:
+                    return row
+                self._live.remove(cave_id)
+            return None
         except Exception as e:
             logger.error(f"随机查询回声洞失败: {e}")
             return None
@@ -116,11 +1027,10 @@ class CaveDatabase:
     def get_caves_by_sender(self, sender_id: int, limit: int = 100, offset: int = 0) -> Tuple[List[int], int]:
         """获取指定用户的回声洞列表（分页）"""
         try:
-            with self._get_conn() as conn:
+            with self._read_conn() as conn:
                 c = conn.cursor()
-                # 获取总数
-                c.execute("SELECT COUNT(*) FROM cave WHERE sender_id = ? AND is_deleted = 0", (sender_id,))
-                total = c.fetchone()[0]
+                # 获取总数（由触发器维护的计数表）
+                total = self._stat(c, self.STAT_SENDER, sender_id)
                 
                 # 获取分页数据
                 c.execute(
@@ -134,38 +1044,332 @@ class CaveDatabase:
             logger.error(f"查询用户回声洞失败: {e}")
             return [], 0
     
-    def delete_cave(self, cave_id: int) -> bool:
-        """软删除回声洞"""
+    PAGE_ANCHOR_CACHE_SIZE = 256
+    
+    def _invalidate_anchors(self, sender_id: int):
+        """用户的回声洞增删后，其所有翻页锚点都会错位，全部丢弃"""
+        with self._anchors_lock:
+            self._anchors_generation += 1
+            for key in [k for k in self._page_anchors if k[0] == sender_id]:
+                del self._page_anchors[key]
+    
+    def get_caves_by_sender_page(self, sender_id: int, page: int, limit: int = 100) -> Tuple[List[int], int]:
+        """按页码获取指定用户的回声洞列表（键集分页）
+
+        用 cave_id < 上一页最后一条 的方式定位，代价与页码深度无关。
+        各页的锚点按用户缓存；缺失的锚点用一次窗口函数扫描一并补齐。
+        """
         try:
-            with self._get_conn() as conn:
+            with self._read_conn() as conn:
                 c = conn.cursor()
-                c.execute("UPDATE cave SET is_deleted = 1 WHERE cave_id = ?", (cave_id,))
-                conn.commit()
-                return True
+                total = self._stat(c, self.STAT_SENDER, sender_id)
+                if page < 1 or (page - 1) * limit >= total:
+                    return [], total
+                if page == 1:
+                    c.execute(
+                        "SELECT cave_id FROM cave WHERE sender_id = ? AND is_deleted = 0 "
+                        "ORDER BY cave_id DESC LIMIT ?",
+                        (sender_id, limit)
+                    )
+                    return [r[0] for r in c.fetchall()], total
+                
+                key = (sender_id, limit)
+                with self._anchors_lock:
+                    generation = self._anchors_generation
+                    anchors = list(self._page_anchors.get(key, ()))
+                    if key in self._page_anchors:
+                        self._page_anchors.move_to_end(key)
+                
+                if len(anchors) < page - 1:
+                    # 从最后一个已知锚点（没有则从头）往后，每隔 limit 条取一个锚点。
+                    # 内层只沿索引读取所需的行数；外层不排序以免建临时 B 树，锚点数量很少，取回后再排序
+                    start = anchors[-1] if anchors else 1 << 62
+                    missing = page - 1 - len(anchors)
+                    c.execute(
+                        "SELECT cave_id FROM ("
+                        "  SELECT cave_id, ROW_NUMBER() OVER (ORDER BY cave_id DESC) AS rn FROM cave "
+                        "  WHERE sender_id = ? AND is_deleted = 0 AND cave_id < ? "
+                        "  ORDER BY cave_id DESC LIMIT ?"
+                        ") WHERE rn % ? = 0",
+                        (sender_id, start, missing * limit, limit)
+                    )
+                    anchors.extend(sorted((r[0] for r in c.fetchall()), reverse=True))
+                    with self._anchors_lock:
+                        # 扫描期间若有增删，锚点可能已过期，不写回缓存
+                        if generation == self._anchors_generation:
+                            self._page_anchors[key] = anchors
+                            self._page_anchors.move_to_end(key)
+                            while len(self._page_anchors) > self.PAGE_ANCHOR_CACHE_SIZE:
+                                self._page_anchors.popitem(last=False)
+                
+                c.execute(
+                    "SELECT cave_id FROM cave WHERE sender_id = ? AND is_deleted = 0 AND cave_id < ? "
+                    "ORDER BY cave_id DESC LIMIT ?",
+                    (sender_id, anchors[page - 2], limit)
+                )
+                return [r[0] for r in c.fetchall()], total
         except Exception as e:
-            logger.error(f"删除回声洞失败: {e}")
-            return False
+            logger.error(f"查询用户回声洞失败: {e}")
+            return [], 0
     
-    def search_caves(self, keyword: str, limit: int = 100) -> List[Tuple]:
-        """搜索回声洞（SQL 层限制）"""
+    V02_DELETED_TEXT = "此回声洞已被删除"
+    IMPORT_CHUNK_SIZE = 10000
+    
+    def _op_import_rows(self, c: sqlite3.Cursor, rows: List[Tuple]) -> Tuple[int, int]:
+        """写入一批旧版数据，保留原 ID；ID 已被占用的记录跳过。返回 (写入数, 跳过数)"""
+        c.execute("SELECT cave_id FROM cave WHERE cave_id BETWEEN ? AND ?", (rows[0][0], rows[-1][0]))
+        existing = {r[0] for r in c.fetchall()}
+        fresh = [r for r in rows if r[0] not in existing]
+        # 只补充尚不知道名称的群（含占位名称），旧库中的历史名称不覆盖当前名称；
+        # 按 ID 顺序写入，同一个群以最后出现的名称为准
+        unknown = self.UNKNOWN_GROUP_NICK
+        self._op_update_group_nicks(c, {
+            r[3]: r[4] for r in fresh if self._group_nicks.get(r[3], unknown) == unknown
+        })
+        c.executemany(
+            f"INSERT INTO cave ({self.ROW_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [r[:4] + r[5:] for r in fresh]
+        )
+        
+        def sync_memory():
+            for cave_id, text, _, _, _, pick_count, _, is_deleted in fresh:
+                if not is_deleted:
+                    self._live.add(cave_id, pick_count)
+                    if self._ngram is not None:
+                        self._ngram.add(cave_id, text)
+            with self._anchors_lock:
+                self._anchors_generation += 1
+                self._page_anchors.clear()
+        
+        self._after_commit.append(sync_memory)
+        self._after_commit.append(self._bump_generation)
+        return len(fresh), len(rows) - len(fresh)
+    
+    def iter_import_v02(self, old_path: str, chunk_size: int = IMPORT_CHUNK_SIZE):
+        """从 v0.2 数据库流式导入回声洞，每写入一批产出一次 (已写入, 已跳过, 总数)
+
+        旧库以只读方式打开，用游标分批读取，内存占用与总行数无关；
+        每批在写线程中作为一个事务提交。跳过 cave_id = 0 的哨兵记录，
+        正文为“此回声洞已被删除”的记录导入为 is_deleted = 1。
+        旧库缺少的列使用默认值填充。
+        """
+        if os.path.abspath(old_path) == os.path.abspath(self.db_path):
+            raise ValueError("不能从当前数据库导入")
+        old = sqlite3.connect(f"file:{old_path}?mode=ro", uri=True, check_same_thread=False)
         try:
-            with self._get_conn() as conn:
-                c = conn.cursor()
+            columns = {r[1] for r in old.execute("PRAGMA table_info(cave)")}
+            if not {"cave_id", "text"} <= columns:
+                raise ValueError("不是有效的回声洞数据库")
+            now = int(time.time())
+            
+            def column(name: str, default: str) -> str:
+                return name if name in columns else default
+            
+            total = old.execute("SELECT COUNT(*) FROM cave WHERE cave_id > 0").fetchone()[0]
+            cursor = old.execute(
+                f"SELECT cave_id, text, {column('sender_id', '0')}, {column('group_id', '0')}, "
+                f"{column('group_nick', 'NULL')}, {column('pick_count', '0')}, {column('date', 'NULL')}, "
+                f"{column('is_deleted', '0')} "
+                "FROM cave WHERE cave_id > 0 ORDER BY cave_id"
+            )
+            imported = skipped = 0
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                rows = [
+                    (
+                        cave_id, text or "", sender_id or 0, group_id or 0, group_nick or self.UNKNOWN_GROUP_NICK,
+                        pick_count or 0, date or now,
+                        1 if is_deleted or text == self.V02_DELETED_TEXT else 0
+                    )
+                    for cave_id, text, sender_id, group_id, group_nick, pick_count, date, is_deleted in rows
+                ]
+                result = self._submit_write(self._op_import_rows, (rows,), None, "导入旧数据失败").result()
+                if result is None:
+                    raise RuntimeError(f"写入 #{rows[0][0]} ~ #{rows[-1][0]} 失败")
+                imported += result[0]
+                skipped += result[1]
+                yield imported, skipped, total
+        finally:
+            old.close()
+    
+    def _op_update_group_nicks(self, c: sqlite3.Cursor, nicks: dict) -> bool:
+        """写入群名称，只写有变化的群；占位名称不会覆盖已知的名称"""
+        unknown = self.UNKNOWN_GROUP_NICK
+        changed = {
+            group_id: nick for group_id, nick in nicks.items()
+            if self._group_nicks.get(group_id) != nick and (nick != unknown or group_id not in self._group_nicks)
+        }
+        if not changed:
+            return True
+        now = int(time.time())
+        c.executemany(
+            "INSERT INTO groups (group_id, nick, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (group_id) DO UPDATE SET nick = excluded.nick, updated_at = excluded.updated_at "
+            "WHERE excluded.nick != ?",
+            [(group_id, nick, now, unknown) for group_id, nick in changed.items()]
+        )
+        
+        def apply():
+            for group_id, nick in changed.items():
+                if nick != unknown or group_id not in self._group_nicks:
+                    self._group_nicks[group_id] = nick
+        
+        self._after_commit.append(apply)
+        return True
+    
+    def update_group_nicks_nowait(self, nicks: dict) -> Future:
+        """投递更新群名称操作（group_id -> 名称），Future 的结果表示是否成功"""
+        return self._submit_write(self._op_update_group_nicks, (dict(nicks),), False, "更新群名称失败")
+    
+    def update_group_nicks(self, nicks: dict) -> bool:
+        """更新群名称，所有该群的回声洞随之显示新名称"""
+        return self.update_group_nicks_nowait(nicks).result()
+    
+    def _op_delete_cave(self, c: sqlite3.Cursor, cave_id: int) -> bool:
+        c.execute("UPDATE cave SET is_deleted = 1 WHERE cave_id = ?", (cave_id,))
+        c.execute("SELECT sender_id FROM cave WHERE cave_id = ?", (cave_id,))
+        row = c.fetchone()
+        if row is not None:
+            self._after_commit.append(lambda: self._invalidate_anchors(row[0]))
+        self._after_commit.append(self._bump_generation)
+        self._after_commit.append(lambda: self._live.remove(cave_id))
+        self._evictions.append(cave_id)
+        if self._ngram is not None:
+            self._after_commit.append(lambda: self._ngram.remove(cave_id))
+        return True
+    
+    def delete_cave_nowait(self, cave_id: int) -> Future:
+        """投递软删除操作，Future 的结果表示是否成功"""
+        return self._submit_write(self._op_delete_cave, (cave_id,), False, "删除回声洞失败")
+    
+    def delete_cave(self, cave_id: int) -> bool:
+        """软删除回声洞"""
+        return self.delete_cave_nowait(cave_id).result()
+    
+    def _bump_generation(self):
+        with self._search_lock:
+            self._write_generation += 1
+    
+    def search_cave_ids(self, keyword: str, limit: int = 100) -> List[int]:
+        """搜索回声洞，返回按 cave_id 从大到小排列的 ID，结果按关键词缓存
+
+        缓存项在过期、写入代数变化或查询上限不足时重新查询；
+        代数在查询前读取，查询期间发生的写入会让这次的结果在下次读取时直接作废。
+        """
+        now = time.monotonic()
+        with self._search_lock:
+            generation = self._write_generation
+            entry = self._search_cache.get(keyword)
+            if entry is not None:
+                entry_generation, expires_at, entry_limit, ids = entry
+                if entry_generation != generation or expires_at < now:
+                    # 过期项在命中时才丢弃，写入时不需要遍历缓存
+                    del self._search_cache[keyword]
+                    self._search_stale += 1
+                elif entry_limit >= limit or len(ids) < entry_limit:
+                    self._search_cache.move_to_end(keyword)
+                    self._search_hits += 1
+                    return list(ids[:limit])
+            self._search_misses += 1
+        try:
+            ids = self._query_cave_ids(keyword, limit)
+        except Exception as e:
+            logger.error(f"搜索回声洞失败: {e}")
+            return []
+        if self.search_cache_size:
+            with self._search_lock:
+                self._search_cache[keyword] = (generation, now + self.search_cache_ttl, limit, array("I", ids))
+                self._search_cache.move_to_end(keyword)
+                while len(self._search_cache) > self.search_cache_size:
+                    self._search_cache.popitem(last=False)
+        return ids
+    
+    def search_cache_metrics(self) -> dict:
+        with self._search_lock:
+            lookups = self._search_hits + self._search_misses
+            return {
+                "size": len(self._search_cache),
+                "hits": self._search_hits,
+                "misses": self._search_misses,
+                "stale": self._search_stale,
+                "generation": self._write_generation,
+                "hit_ratio": self._search_hits / lookups if lookups else 0.0,
+            }
+    
+    def _query_cave_ids(self, keyword: str, limit: int) -> List[int]:
+        """搜索回声洞，只返回按 cave_id 从大到小排列的 ID（SQL 层限制）
+
+        关键词不少于 3 个字符时走 trigram 全文索引（索引中只有未删除的记录，无需回表），
+        更短的关键词无法构成 trigram，退回 LIKE 扫描。
+        没有 FTS5 时用 bigram 索引求出候选 ID，再分批回表用 LIKE 核对原文。
+        正文由调用方按需用 get_caves_by_ids 分块读取，不必一次性载入全部结果。
+        """
+        candidates = self._ngram.candidates(keyword) if self._ngram is not None else None
+        with self._read_conn() as conn:
+            c = conn.cursor()
+            if candidates is not None:
+                ids = []
+                while len(ids) < limit:
+                    chunk = list(islice(candidates, min(max(limit, 64), 500)))
+                    if not chunk:
+                        break
+                    c.execute(
+                        f"SELECT cave_id FROM cave WHERE cave_id IN ({','.join('?' * len(chunk))}) "
+                        "AND is_deleted = 0 AND text LIKE ? ORDER BY cave_id DESC",
+                        (*chunk, f"%{keyword}%")
+                    )
+                    ids.extend(r[0] for r in c.fetchall())
+                return ids[:limit]
+            if self.fts_enabled and len(keyword) >= 3:
+                # 整个关键词作为一个短语匹配，即子串匹配
+                phrase = '"' + keyword.replace('"', '""') + '"'
+                c.execute(
+                    "SELECT rowid FROM cave_fts WHERE cave_fts MATCH ? ORDER BY rowid DESC LIMIT ?",
+                    (phrase, limit)
+                )
+            else:
                 c.execute(
-                    "SELECT cave_id, text, sender_id, group_id, group_nick, pick_count, date, is_deleted "
-                    "FROM cave WHERE is_deleted = 0 AND text LIKE ? "
+                    "SELECT cave_id FROM cave WHERE is_deleted = 0 AND text LIKE ? "
                     "ORDER BY cave_id DESC LIMIT ?",
                     (f"%{keyword}%", limit)
                 )
-                return c.fetchall()
+            return [r[0] for r in c.fetchall()]
+    
+    def get_caves_by_ids(self, cave_ids: List[int]) -> List[Tuple]:
+        """按给定顺序批量读取回声洞，跳过不存在或已删除的记录"""
+        try:
+            with self._read_conn() as conn:
+                c = conn.cursor()
+                
+                def query():
+                    rows = {}
+                    for i in range(0, len(cave_ids), 500):
+                        chunk = cave_ids[i:i + 500]
+                        c.execute(
+                            f"SELECT {self.ROW_COLUMNS} FROM cave "
+                            f"WHERE cave_id IN ({','.join('?' * len(chunk))}) AND is_deleted = 0",
+                            chunk
+                        )
+                        rows.update((r[0], r) for r in c.fetchall())
+                    return rows
+                
+                return self._read_merged(
+                    query, lambda rows: [self._merge_picks(self._row(rows[i])) for i in cave_ids if i in rows]
+                )
         except Exception as e:
-            logger.error(f"搜索回声洞失败: {e}")
+            logger.error(f"批量查询回声洞失败: {e}")
             return []
     
+    def search_caves(self, keyword: str, limit: int = 100) -> List[Tuple]:
+        """搜索回声洞，返回完整的行"""
+        return self.get_caves_by_ids(self.search_cave_ids(keyword, limit))
+    
     def get_max_cave_id(self) -> int:
         """获取当前最大的 cave_id"""
         try:
-            with self._get_conn() as conn:
+            with self._read_conn() as conn:
                 c = conn.cursor()
                 c.execute("SELECT MAX(cave_id) FROM cave")
                 result = c.fetchone()[0]
@@ -175,8 +1379,543 @@ class CaveDatabase:
             return 0
 
 
-async def _get_group_name(event: AstrMessageEvent, group_id: int) -> str:
-    """获取群名称"""
+class AsyncCaveDatabase:
+    """CaveDatabase 的异步外观
+
+    读操作提交到一个专用的有界线程池中执行；写操作直接投递给写线程，
+    事件循环只负责等待结果，不会被 sqlite3 的同步调用卡住。
+    """
+    
+    def __init__(self, db: CaveDatabase, max_workers: int = 4):
+        self._db = db
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, max_workers),
+            thread_name_prefix="cave-db"
+        )
+        # 统计信息
+        self._stats_lock = threading.Lock()
+        self._queue_depth = 0
+        self._submitted = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+    
+    async def _run(self, func: Callable[..., Any], *args) -> Any:
+        """在数据库线程池中执行同步调用，并记录排队等待时间"""
+        enqueued_at = time.perf_counter()
+        with self._stats_lock:
+            self._queue_depth += 1
+            self._submitted += 1
+        
+        def task():
+            waited = time.perf_counter() - enqueued_at
+            with self._stats_lock:
+                self._queue_depth -= 1
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+            return func(*args)
+        
+        def on_done(fut: Future):
+            # 尚未开始就被取消的任务不会经过 task()，需要在这里出队
+            if fut.cancelled():
+                with self._stats_lock:
+                    self._queue_depth -= 1
+        
+        fut = self._executor.submit(task)
+        fut.add_done_callback(on_done)
+        return await asyncio.wrap_future(fut)
+    
+    def metrics(self) -> dict:
+        """返回线程池的排队深度与等待时间统计"""
+        with self._stats_lock:
+            started = self._submitted - self._queue_depth
+            return {
+                "queue_depth": self._queue_depth,
+                "submitted": self._submitted,
+                "avg_wait_ms": self._wait_total / started * 1000 if started else 0.0,
+                "max_wait_ms": self._wait_max * 1000,
+            }
+    
+    async def add_cave(self, sender_id: int, group_id: int, group_nick: str, content: str) -> Optional[int]:
+        return await asyncio.wrap_future(self._db.add_cave_nowait(sender_id, group_id, group_nick, content))
+    
+    def row_cache_metrics(self) -> dict:
+        return self._db.row_cache_metrics()
+    
+    def search_cache_metrics(self) -> dict:
+        return self._db.search_cache_metrics()
+    
+    async def get_cave(self, cave_id: int) -> Optional[Tuple]:
+        # 行缓存命中时直接在事件循环中返回，不占用数据库线程；
+        # 锁内只有字典操作，但事件循环仍不等待，锁被占用时按未命中处理
+        row = self._db.get_cached_cave(cave_id, blocking=False)
+        if row is not None:
+            return row
+        return await self._run(self._db.get_cave, cave_id)
+    
+    async def increment_pick_count(self, cave_id: int) -> bool:
+        # 只是内存计数，直接在事件循环中执行即可
+        return self._db.increment_pick_count(cave_id)
+    
+    async def get_random_cave(self) -> Optional[Tuple]:
+        return await self._run(self._db.get_random_cave)
+    
+    async def get_caves_by_sender(self, sender_id: int, limit: int = 100, offset: int = 0) -> Tuple[List[int], int]:
+        return await self._run(self._db.get_caves_by_sender, sender_id, limit, offset)
+    
+    async def get_caves_by_sender_page(self, sender_id: int, page: int, limit: int = 100) -> Tuple[List[int], int]:
+        return await self._run(self._db.get_caves_by_sender_page, sender_id, page, limit)
+    
+    async def update_group_nicks(self, nicks: dict) -> bool:
+        return await asyncio.wrap_future(self._db.update_group_nicks_nowait(nicks))
+    
+    async def delete_cave(self, cave_id: int) -> bool:
+        return await asyncio.wrap_future(self._db.delete_cave_nowait(cave_id))
+    
+    async def search_caves(self, keyword: str, limit: int = 100) -> List[Tuple]:
+        return await self._run(self._db.search_caves, keyword, limit)
+    
+    async def search_cave_ids(self, keyword: str, limit: int = 100) -> List[int]:
+        return await self._run(self._db.search_cave_ids, keyword, limit)
+    
+    async def iter_caves(self, cave_ids: List[int], chunk_size: int):
+        """按 chunk_size 分块读取回声洞，逐块产出
+
+        调用方处理当前块时，下一块已经在数据库线程中读取，内存中最多同时存在两块。
+        """
+        chunks = [cave_ids[i:i + chunk_size] for i in range(0, len(cave_ids), chunk_size)]
+        if not chunks:
+            return
+        pending = asyncio.ensure_future(self._run(self._db.get_caves_by_ids, chunks[0]))
+        try:
+            for i in range(len(chunks)):
+                rows = await pending
+                if i + 1 < len(chunks):
+                    pending = asyncio.ensure_future(self._run(self._db.get_caves_by_ids, chunks[i + 1]))
+                if rows:
+                    yield rows
+        finally:
+            pending.cancel()
+    
+    async def get_live_count(self, scope: str = CaveDatabase.STAT_GLOBAL, key: int = 0) -> int:
+        return await self._run(self._db.get_live_count, scope, key)
+    
+    async def import_v02(self, old_path: str):
+        """异步逐批执行 v0.2 数据导入，每批完成后产出一次进度"""
+        it = self._db.iter_import_v02(old_path)
+        try:
+            while True:
+                progress = await self._run(next, it, None)
+                if progress is None:
+                    return
+                yield progress
+        finally:
+            await self._run(it.close)
+    
+    async def get_max_cave_id(self) -> int:
+        return await self._run(self._db.get_max_cave_id)
+    
+    async def close(self):
+        """等待线程池中的任务结束后关闭连接池"""
+        def shutdown():
+            self._executor.shutdown(wait=True)
+            self._db.close()
+        await asyncio.to_thread(shutdown)
+
+
+class GroupNameCache:
+    """群名称缓存：LRU 淘汰 + TTL 过期 + 同一群的并发查询合并
+
+    只缓存成功取到的群名；查询失败不缓存，下次仍会重新请求。
+    """
+    
+    def __init__(self, capacity: int = 1024, ttl: float = 3600.0):
+        self.capacity = max(1, capacity)
+        self.ttl = ttl
+        self._entries: "OrderedDict[int, Tuple[str, float]]" = OrderedDict()
+        self._inflight: dict = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+    
+    def get_cached(self, group_id: int) -> Optional[str]:
+        """只查缓存，不发起请求"""
+        entry = self._entries.get(group_id)
+        if entry is None:
+            return None
+        name, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._entries[group_id]
+            return None
+        self._entries.move_to_end(group_id)
+        return name
+    
+    def put(self, group_id: int, name: str):
+        self._entries[group_id] = (name, time.monotonic() + self.ttl)
+        self._entries.move_to_end(group_id)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+    
+    def put_many(self, names: dict):
+        """批量写入（预取群列表时使用），超出容量时保留最后写入的部分"""
+        for group_id, name in names.items():
+            self.put(group_id, name)
+    
+    async def get(self, group_id: int, loader: Callable[[], Any]) -> Optional[str]:
+        """读取群名，未命中时调用 loader() 获取；同一群同时只会有一个请求在途"""
+        name = self.get_cached(group_id)
+        if name is not None:
+            self.hits += 1
+            return name
+        task = self._inflight.get(group_id)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(loader())
+            self._inflight[group_id] = task
+            
+            def on_done(t: asyncio.Future):
+                self._inflight.pop(group_id, None)
+                if not t.cancelled() and t.exception() is None and t.result():
+                    self.put(group_id, t.result())
+            
+            task.add_done_callback(on_done)
+        # 某个等待方被取消时不影响其他共享同一请求的等待方
+        return await asyncio.shield(task)
+    
+    def metrics(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_ratio": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+        }
+
+
+class CircuitBreaker:
+    """简单的熔断器
+
+    连续失败达到阈值后进入熔断状态，冷却期内直接拒绝调用；
+    冷却结束后放行一次试探调用，成功则恢复，失败则重新熔断。
+    """
+    
+    def __init__(self, threshold: int = 5, cooldown: float = 60.0):
+        self.threshold = max(1, threshold)
+        self.cooldown = cooldown
+        self.failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+    
+    def allow(self) -> bool:
+        if self._opened_at is None:
+            return True
+        if self._probing or time.monotonic() - self._opened_at < self.cooldown:
+            return False
+        self._probing = True
+        return True
+    
+    def record_success(self):
+        self.failures = 0
+        self._opened_at = None
+        self._probing = False
+    
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.failures >= self.threshold:
+            if self._opened_at is None:
+                logger.warning(f"连续 {self.failures} 次调用失败，熔断 {self.cooldown} 秒")
+            self._opened_at = time.monotonic()
+    
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+
+class MessageTemplate:
+    """预编译的消息模板
+
+    加载时用 string.Formatter 解析一次，把占位符改写成 % 格式串、用 itemgetter 一次取出全部参数，
+    渲染时不再重复解析模板；带格式说明、转换或属性/下标访问（如 {x:>5}、{x!r}、{x[0]}）的模板
+    退回 str.format_map。
+    不在 fields 中的占位符原样保留在输出里，记录在 unknown 中供加载时报告。
+    bind() 可以预先渲染除某个占位符以外的部分，供只有个别字段变化的回复复用。
+    """
+    
+    def __init__(self, source: str, fields=()):
+        self.source = source
+        self.fields: Tuple[str, ...] = ()
+        self.unknown: List[str] = []
+        self.error: Optional[str] = None
+        self._fmt = source
+        self._getter: Optional[Callable[[dict], tuple]] = None
+        self._generic = False
+        # (% 转义后的字面文本, 占位符名或 None) 序列，供 bind() 分段渲染
+        self._tokens: List[Tuple[str, Optional[str]]] = []
+        self._compile(frozenset(fields))
+    
+    def _compile(self, allowed: frozenset):
+        try:
+            parsed = list(string.Formatter().parse(self.source))
+        except ValueError as e:
+            # 花括号不配对，整段按原文输出
+            self.error = str(e)
+            return
+        percent, braces, names = [], [], []
+        for literal, name, spec, conversion in parsed:
+            percent.append(literal.replace("%", "%%"))
+            braces.append(literal.replace("{", "{{").replace("}", "}}"))
+            if name is None:
+                self._tokens.append((percent[-1], None))
+                continue
+            raw = "{" + name + (f"!{conversion}" if conversion else "") + (f":{spec}" if spec else "") + "}"
+            # {text[0]}、{cave_id.real} 按字段本身的名称判断是否可用
+            base = name.split(".")[0].split("[")[0]
+            if base not in allowed:
+                self.unknown.append(name)
+                percent.append(raw.replace("%", "%%"))
+                braces.append(raw.replace("{", "{{").replace("}", "}}"))
+                self._tokens.append((percent[-2] + percent[-1], None))
+                continue
+            if spec or conversion or base != name:
+                self._generic = True
+            percent.append("%s")
+            braces.append(raw)
+            names.append(base)
+            self._tokens.append((percent[-2], name))
+        self.fields = tuple(names)
+        if not names:
+            self._fmt = "".join(percent).replace("%%", "%")
+        elif self._generic:
+            self._fmt = "".join(braces)
+        else:
+            self._fmt = "".join(percent)
+            if len(names) == 1:
+                name = names[0]
+                self._getter = lambda kwargs: (kwargs[name],)
+            else:
+                self._getter = itemgetter(*names)
+    
+    def render(self, kwargs: dict) -> str:
+        if self._getter is None and not self._generic:
+            return self._fmt
+        try:
+            if self._generic:
+                return self._fmt.format_map(kwargs)
+            return self._fmt % self._getter(kwargs)
+        except Exception as e:
+            logger.warning(f"消息模板渲染失败，按原文输出: {e!r}")
+            return self.source
+    
+    def bind(self, kwargs: dict, field: str) -> Optional[Tuple[str, ...]]:
+        """预先渲染除 field 以外的部分，返回以 field 为分隔的静态片段
+
+        str(值).join(片段) 即为完整结果。模板退回 format_map、格式错误或缺少参数时返回 None。
+        """
+        if self._generic or self.error is not None:
+            return None
+        parts, fmt, names = [], [], []
+        try:
+            for literal, name in self._tokens:
+                fmt.append(literal)
+                if name == field:
+                    parts.append("".join(fmt) % tuple(kwargs[n] for n in names))
+                    fmt, names = [], []
+                elif name is not None:
+                    fmt.append("%s")
+                    names.append(name)
+            parts.append("".join(fmt) % tuple(kwargs[n] for n in names))
+        except Exception:
+            return None
+        return tuple(parts)
+
+
+class TokenBucket:
+    """可调速的令牌桶
+
+    令牌允许透支：取令牌时先扣除再按欠额等待，并发的调用方按到达顺序排队，无需加锁。
+    """
+    
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+    
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    async def acquire(self):
+        self._refill()
+        self.tokens -= 1
+        if self.tokens < 0:
+            await asyncio.sleep(-self.tokens / self.rate)
+    
+    def delay(self) -> float:
+        """下一次取令牌需要等待的秒数（不取令牌）"""
+        self._refill()
+        return max(0.0, 1.0 - self.tokens) / self.rate
+    
+    def drain(self):
+        """清空剩余令牌，下一次发送必须等待"""
+        self._refill()
+        self.tokens = min(self.tokens, 0.0)
+
+
+class SendPacer:
+    """出站消息限速器
+
+    每个平台、每个会话各有一个令牌桶，发送前两个桶都要取得令牌。
+    速率按 AIMD 自适应：发送成功且耗时正常时加性增加，失败或耗时超过阈值时减半并清空令牌；
+    各桶的速率限制在初始值的 1/8 到 4 倍之间。所有批量发送都应经过同一个实例。
+    """
+    
+    MAX_CONVERSATIONS = 1024
+    
+    def __init__(self, rate: float = 2.0, platform_rate: float = 5.0, burst: float = 3.0,
+                 slow_threshold: float = 3.0):
+        self.rate = max(0.1, rate)
+        self.platform_rate = max(0.1, platform_rate)
+        self.burst = burst
+        self.slow_threshold = slow_threshold
+        self._platforms: dict = {}
+        self._conversations: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.sent = 0
+        self.failed = 0
+    
+    def _buckets(self, event: AstrMessageEvent) -> Tuple[TokenBucket, TokenBucket]:
+        platform = event.get_platform_name()
+        platform_bucket = self._platforms.get(platform)
+        if platform_bucket is None:
+            platform_bucket = self._platforms[platform] = TokenBucket(self.platform_rate, self.burst)
+        umo = event.unified_msg_origin
+        bucket = self._conversations.get(umo)
+        if bucket is None:
+            bucket = self._conversations[umo] = TokenBucket(self.rate, self.burst)
+            while len(self._conversations) > self.MAX_CONVERSATIONS:
+                self._conversations.popitem(last=False)
+        else:
+            self._conversations.move_to_end(umo)
+        return platform_bucket, bucket
+    
+    def _adjust(self, bucket: TokenBucket, base: float, congested: bool):
+        if congested:
+            bucket.rate = max(base / 8, bucket.rate / 2)
+            bucket.drain()
+        else:
+            bucket.rate = min(base * 4, bucket.rate + base / 10)
+    
+    def delay(self, event: AstrMessageEvent) -> float:
+        """向该会话发送下一条消息前需要等待的秒数"""
+        return max(bucket.delay() for bucket in self._buckets(event))
+    
+    async def send(self, event: AstrMessageEvent, chain: MessageChain) -> bool:
+        """限速发送一条消息，返回是否成功；发送结果与耗时用于调整速率"""
+        platform_bucket, bucket = self._buckets(event)
+        await platform_bucket.acquire()
+        await bucket.acquire()
+        started = time.monotonic()
+        try:
+            await event.send(chain)
+            ok = True
+        except Exception as e:
+            logger.warning(f"发送消息失败: {e}")
+            ok = False
+        congested = not ok or time.monotonic() - started > self.slow_threshold
+        self._adjust(platform_bucket, self.platform_rate, congested)
+        self._adjust(bucket, self.rate, congested)
+        if ok:
+            self.sent += 1
+        else:
+            self.failed += 1
+        return ok
+
+
+class FallbackSender:
+    """逐条发送一批消息（合并转发失败后的降级通道，也可供任何需要群发的指令使用）
+
+    同时在途的发送数不超过 concurrency；单条失败后按指数退避重试 retries 次；
+    累计有 max_failures 条在重试后仍然失败且期间没有任何成功时，放弃剩余消息。
+    发送本身经过 SendPacer 限速；退避与限速的等待不会越过开始发送或上一次成功送达后 max_wait 秒，
+    需要等到截止时间之后的消息直接放弃，连同剩余消息一起不再发送。
+    正常但较慢的发送每次成功都会顺延截止时间，只有长时间没有进展时才会放弃。
+    """
+    
+    def __init__(self, pacer: SendPacer, concurrency: int = 3, retries: int = 2,
+                 backoff: float = 1.0, max_failures: int = 3, max_wait: float = 10.0):
+        self.pacer = pacer
+        self.concurrency = max(1, concurrency)
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self.max_failures = max(1, max_failures)
+        self.max_wait = max(0.0, max_wait)
+    
+    async def _send_one(self, event: AstrMessageEvent, chain: MessageChain, deadline: float) -> Optional[bool]:
+        """发送一条消息并按需重试；需要等到 deadline 之后时返回 None"""
+        for attempt in range(self.retries + 1):
+            if time.monotonic() + self.pacer.delay(event) > deadline:
+                return None
+            if await self.pacer.send(event, chain):
+                return True
+            if attempt < self.retries:
+                wait = self.backoff * 2 ** attempt
+                if time.monotonic() + wait > deadline:
+                    return None
+                await asyncio.sleep(wait)
+        return False
+    
+    async def send_all(self, event: AstrMessageEvent, chains: List[MessageChain]) -> Tuple[int, bool]:
+        """发送全部消息，返回 (成功送达的条数, 是否放弃了剩余消息)"""
+        deadline = time.monotonic() + self.max_wait
+        pending = iter(chains)
+        delivered = 0
+        failures = 0
+        aborted = False
+        
+        async def worker():
+            nonlocal delivered, failures, aborted, deadline
+            for chain in pending:
+                if aborted or failures >= self.max_failures:
+                    aborted = True
+                    return
+                ok = await self._send_one(event, chain, deadline)
+                if ok is None:
+                    aborted = True
+                    return
+                if ok:
+                    delivered += 1
+                    failures = 0
+                    deadline = time.monotonic() + self.max_wait
+                else:
+                    failures += 1
+        
+        await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(chains)))))
+        if aborted:
+            logger.warning(f"逐条发送放弃：送达 {delivered}/{len(chains)} 条")
+        elif delivered < len(chains):
+            logger.warning(f"逐条发送结束：送达 {delivered}/{len(chains)} 条")
+        return delivered, aborted
+
+
+async def _fetch_group_list(client) -> dict:
+    """通过 get_group_list 一次性获取机器人所在的全部群名称"""
+    ret = await client.api.call_action('get_group_list')
+    # 部分实现会把列表包在 data 字段里
+    if isinstance(ret, dict):
+        ret = ret.get("data", [])
+    names = {}
+    for item in ret or []:
+        if isinstance(item, dict) and item.get("group_id") and item.get("group_name"):
+            names[int(item["group_id"])] = item["group_name"]
+    return names
+
+
+async def _fetch_group_name(event: AstrMessageEvent, group_id: int) -> Optional[str]:
+    """通过平台接口获取群名称，失败时返回 None"""
     if event.get_platform_name() == "aiocqhttp":
         try:
             from astrbot.core.platform.sources.aiocqhttp.aiocqhttp_message_event import AiocqhttpMessageEvent
@@ -188,7 +1927,7 @@ async def _get_group_name(event: AstrMessageEvent, group_id: int) -> str:
                     return ret['groupName']
         except Exception as e:
             logger.error(f"获取群名称失败: {e}")
-    return "未知群聊"
+    return None
 
 
 @register("astrbot_plugin_cave", "lingyu", "基于SQLite3的简单回声洞插件", "0.3")
@@ -198,33 +1937,236 @@ class CavePlugin(Star):
         self.config = config if config else AstrBotConfig({})
         
         # 初始化数据库路径
-        StarTools.get_data_dir()
+        plugin_data_dir = str(StarTools.get_data_dir())
         if not os.path.exists(plugin_data_dir):
             os.makedirs(plugin_data_dir)
         
         db_path = os.path.join(plugin_data_dir, "cave.db")
+        self.data_dir = plugin_data_dir
         
-        # 初始化数据库
-        self.db = CaveDatabase(db_path)
+        # 初始化数据库（同步实现包在异步外观里，避免阻塞事件循环）
+        self.db = AsyncCaveDatabase(
+            CaveDatabase(
+                db_path,
+                read_pool_size=self.config.get("db_read_pool_size", 4),
+                cache_size_kb=self.config.get("db_cache_size_kb", 16384),
+                mmap_size=self.config.get("db_mmap_size", 268435456),
+                busy_timeout_ms=self.config.get("db_busy_timeout_ms", 10000),
+                write_batch_size=self.config.get("db_write_batch_size", 128),
+                pick_flush_interval=self.config.get("pick_flush_interval", 5.0),
+                pick_flush_threshold=self.config.get("pick_flush_threshold", 1000),
+                random_mode=self.config.get("random_mode", "uniform"),
+                row_cache_size=self.config.get("row_cache_size", 1024),
+                search_cache_size=self.config.get("search_cache_size", 128),
+                search_cache_ttl=self.config.get("search_cache_ttl", 300)
+            ),
+            max_workers=self.config.get("db_executor_workers", 4)
+        )
         
         # 读取配置
         self.super_admins = self.config.get("super_admins", [])
         self.max_content_length = self.config.get("max_content_length", 200)
         self.page_size = self.config.get("page_size", 100)
+        self.search_max_results = self.config.get("search_max_results", 1000)
+        self.forward_max_nodes = max(1, self.config.get("forward_max_nodes", 30))
+        self.forward_max_chars = self.config.get("forward_max_chars", 4000)
         self.quotes = self.config.get("quotes", [])
-        self.messages = self.config.get("messages", {})
+        # 热门回声洞的 cave_detail 静态部分缓存：cave_id -> (渲染时的群名称, 以查看次数分隔的片段)
+        self.reply_cache_size = max(0, self.config.get("reply_cache_size", 256))
+        self._detail_cache: "OrderedDict[int, Tuple[str, Tuple[str, ...]]]" = OrderedDict()
+        self.detail_cache_hits = 0
+        self.detail_cache_misses = 0
+        self._load_messages()
+        
+        # 群名称缓存
+        self.group_names = GroupNameCache(
+            capacity=self.config.get("group_name_cache_size", 1024),
+            ttl=self.config.get("group_name_cache_ttl", 3600)
+        )
+        self.group_name_refresh_interval = self.config.get("group_name_refresh_interval", 1800)
+        self.group_name_timeout = self.config.get("group_name_timeout", 3.0)
+        self.defer_group_name = self.config.get("defer_group_name", False)
+        # 每个平台一个熔断器，一个平台的接口故障不影响其他平台
+        self.group_api_breaker_threshold = self.config.get("group_name_breaker_threshold", 5)
+        self.group_api_breaker_cooldown = self.config.get("group_name_breaker_cooldown", 60)
+        self.group_api_breakers: dict = {}
+        self._cq_client = None
+        self._background_tasks: set = set()
+        
+        # 批量发送限速（搜索结果等）
+        self.pacer = SendPacer(
+            rate=self.config.get("send_rate", 2.0),
+            platform_rate=self.config.get("send_platform_rate", 5.0),
+            burst=self.config.get("send_burst", 3),
+            slow_threshold=self.config.get("send_slow_threshold", 3.0)
+        )
+        self.fallback_sender = FallbackSender(
+            self.pacer,
+            concurrency=self.config.get("fallback_concurrency", 3),
+            retries=self.config.get("fallback_retries", 2),
+            max_failures=self.config.get("fallback_max_failures", 3),
+            max_wait=self.config.get("fallback_max_wait", 10.0)
+        )
         
         logger.info(f"回声洞插件已加载，超级管理员: {self.super_admins}")
     
+    # 各条消息可用的占位符，加载模板时据此检查
+    MESSAGE_FIELDS = {
+        "content_too_long": ("max_length",),
+        "add_success": ("cave_id", "quote"),
+        "cave_detail": ("cave_id", "text", "group_nick", "pick_count"),
+        "cave_not_exist": ("cave_id",),
+        "cave_already_deleted": ("cave_id",),
+        "delete_success": ("cave_id",),
+        "no_cave_records": ("qq",),
+        "page_out_of_range": ("qq", "total_pages"),
+        "page_no_data": ("page",),
+        "mycave_result": ("qq", "page", "total_pages", "total", "id_list"),
+        "search_result_header": ("count", "page", "total_pages"),
+        "search_page_out_of_range": ("total_pages",),
+        "search_partial": ("delivered", "total"),
+        "search_result_detail": ("cave_id", "text", "group_nick", "pick_count"),
+        "import_not_found": ("path",),
+        "import_progress": ("done", "total", "percent"),
+        "import_done": ("imported", "skipped", "seconds"),
+        "import_failed": ("error", "imported"),
+    }
+    
+    def _load_messages(self):
+        """预编译 messages 配置中的全部模板
+
+        插件加载时执行一次；修改配置后 AstrBot 会重载插件，模板随之重新编译。
+        未知占位符与格式错误在这里报告，渲染时不再静默吞掉。
+        """
+        self.messages = self.config.get("messages", {})
+        self._templates = {}
+        self._detail_cache.clear()
+        for key, source in self.messages.items():
+            fields = self.MESSAGE_FIELDS.get(key, ())
+            template = MessageTemplate(source or "", fields)
+            if template.error:
+                logger.warning(f"消息模板 {key} 格式错误，将按原文输出: {template.error}")
+            elif template.unknown:
+                logger.warning(
+                    f"消息模板 {key} 含有未知占位符 {', '.join(template.unknown)}，"
+                    f"可用的占位符: {', '.join(fields) or '无'}"
+                )
+            self._templates[key] = template
+    
     def _get_message(self, key: str, **kwargs) -> str:
         """获取配置的消息文本"""
-        msg = self.messages.get(key, "")
-        if kwargs:
-            try:
-                msg = msg.format(**kwargs)
-            except Exception:
-                pass
-        return msg
+        template = self._templates.get(key)
+        return template.render(kwargs) if template is not None else ""
+    
+    def _render_cave_detail(self, row: Tuple, pick_count: int) -> str:
+        """渲染 cave_detail：静态部分按 cave_id 缓存，每次只格式化查看次数
+
+        缓存项记录渲染时的群名称，群改名后自动重新渲染；删除回声洞与重新加载模板时清除。
+        """
+        # row: (cave_id, text, sender_id, group_id, group_nick, pick_count, date, is_deleted)
+        cave_id = row[0]
+        entry = self._detail_cache.get(cave_id)
+        if entry is not None and entry[0] == row[4]:
+            self._detail_cache.move_to_end(cave_id)
+            self.detail_cache_hits += 1
+            return str(pick_count).join(entry[1])
+        self.detail_cache_misses += 1
+        kwargs = dict(cave_id=cave_id, text=row[1], group_nick=row[4], pick_count=pick_count)
+        template = self._templates.get("cave_detail")
+        parts = template.bind(kwargs, "pick_count") if template is not None and self.reply_cache_size else None
+        if parts is None:
+            return self._get_message("cave_detail", **kwargs)
+        self._detail_cache[cave_id] = (row[4], parts)
+        self._detail_cache.move_to_end(cave_id)
+        while len(self._detail_cache) > self.reply_cache_size:
+            self._detail_cache.popitem(last=False)
+        return str(pick_count).join(parts)
+    
+    async def initialize(self):
+        """插件启动后开始后台预取群名称"""
+        if self.group_name_refresh_interval > 0:
+            self._spawn(self._refresh_group_names_loop())
+    
+    def _spawn(self, coro) -> asyncio.Task:
+        """创建后台任务并持有引用，插件卸载时统一取消"""
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        return task
+    
+    def _get_cq_client(self):
+        """获取 aiocqhttp 客户端：优先从平台适配器取，取不到时使用最近一次事件中的客户端"""
+        try:
+            platform = self.context.get_platform(filter.PlatformAdapterType.AIOCQHTTP)
+            if platform is not None and hasattr(platform, "get_client"):
+                return platform.get_client()
+        except Exception as e:
+            logger.debug(f"获取 aiocqhttp 平台失败: {e}")
+        return self._cq_client
+    
+    async def _refresh_group_names_loop(self):
+        """后台任务：启动时及之后每隔一段时间用 get_group_list 批量刷新群名称缓存"""
+        while True:
+            interval = self.group_name_refresh_interval
+            client = self._get_cq_client()
+            if client is None:
+                # 平台尚未连接，稍后重试
+                interval = min(interval, 30)
+            else:
+                try:
+                    names = await _fetch_group_list(client)
+                    self.group_names.put_many(names)
+                    await self.db.update_group_nicks(names)
+                    logger.info(f"已预取 {len(names)} 个群的名称")
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.warning(f"预取群列表失败: {e}")
+                    interval = min(interval, 60)
+            await asyncio.sleep(interval)
+    
+    def _get_group_api_breaker(self, platform: str) -> CircuitBreaker:
+        """获取指定平台的群名称查询熔断器"""
+        breaker = self.group_api_breakers.get(platform)
+        if breaker is None:
+            breaker = self.group_api_breakers[platform] = CircuitBreaker(
+                threshold=self.group_api_breaker_threshold,
+                cooldown=self.group_api_breaker_cooldown
+            )
+        return breaker
+    
+    async def _fetch_group_name_guarded(self, event: AstrMessageEvent, group_id: int) -> Optional[str]:
+        """带超时与熔断保护的单群名称查询"""
+        platform = event.get_platform_name()
+        # 只有 aiocqhttp 提供群名称接口，其他平台不发起调用，也不计入熔断
+        if platform != "aiocqhttp":
+            return None
+        breaker = self._get_group_api_breaker(platform)
+        if not breaker.allow():
+            return None
+        try:
+            name = await asyncio.wait_for(_fetch_group_name(event, group_id), self.group_name_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"获取群 {group_id} 名称超时")
+            name = None
+        if name:
+            breaker.record_success()
+        else:
+            breaker.record_failure()
+        return name
+    
+    async def _get_group_name(self, event: AstrMessageEvent, group_id: int) -> str:
+        """获取群名称（优先读缓存）"""
+        if self._cq_client is None and event.get_platform_name() == "aiocqhttp":
+            self._cq_client = getattr(event, "bot", None)
+        name = await self.group_names.get(group_id, lambda: self._fetch_group_name_guarded(event, group_id))
+        return name or CaveDatabase.UNKNOWN_GROUP_NICK
+    
+    async def _resolve_group_name_later(self, event: AstrMessageEvent, group_id: int):
+        """后台任务：查到群名称后写入 groups 表"""
+        name = await self._get_group_name(event, group_id)
+        if name != CaveDatabase.UNKNOWN_GROUP_NICK:
+            await self.db.update_group_nicks({group_id: name})
     
     def _is_super_admin(self, qq: int) -> bool:
         """检查是否为超级管理员"""
@@ -254,9 +2196,19 @@ class CavePlugin(Star):
         
         sender_id = int(event.get_sender_id())
         group_id = int(event.message_obj.group_id) if event.message_obj.group_id else 0
-        group_nick = await _get_group_name(event, group_id) if group_id else "私聊"
+        # 先插入后补群名：缓存未命中时用占位名称立即写入，群名称在后台查询后回填
+        resolve_later = bool(group_id) and self.defer_group_name and self.group_names.get_cached(group_id) is None
+        if not group_id:
+            group_nick = "私聊"
+        elif resolve_later:
+            group_nick = CaveDatabase.UNKNOWN_GROUP_NICK
+        else:
+            group_nick = await self._get_group_name(event, group_id)
+        
+        new_id = await self.db.add_cave(sender_id, group_id, group_nick, content)
         
-        new_id = self.db.add_cave(sender_id, group_id, group_nick, content)
+        if new_id and resolve_later:
+            self._spawn(self._resolve_group_name_later(event, group_id))
         
         if new_id:
             quote = random.choice(self.quotes) if self.quotes else ""
@@ -278,7 +2230,7 @@ class CavePlugin(Star):
             return
         
         cave_id = int(cave_id_str)
-        row = self.db.get_cave(cave_id)
+        row = await self.db.get_cave(cave_id)
         
         if row is None:
             yield event.plain_result(
@@ -293,36 +2245,20 @@ class CavePlugin(Star):
             )
             return
         
-        self.db.increment_pick_count(cave_id)
-        yield event.plain_result(
-            self._get_message(
-                "cave_detail",
-                cave_id=row[0],
-                text=row[1],
-                group_nick=row[4],
-                pick_count=row[5] + 1
-            )
-        )
+        await self.db.increment_pick_count(cave_id)
+        yield event.plain_result(self._render_cave_detail(row, row[5] + 1))
     
     @filter.command("cq")
     async def cave_random(self, event: AstrMessageEvent):
         """随机查看回声洞"""
-        row = self.db.get_random_cave()
+        row = await self.db.get_random_cave()
         
         if row is None:
             yield event.plain_result(self._get_message("cave_empty"))
             return
         
-        self.db.increment_pick_count(row[0])
-        yield event.plain_result(
-            self._get_message(
-                "cave_detail",
-                cave_id=row[0],
-                text=row[1],
-                group_nick=row[4],
-                pick_count=row[5] + 1
-            )
-        )
+        await self.db.increment_pick_count(row[0])
+        yield event.plain_result(self._render_cave_detail(row, row[5] + 1))
     
     @filter.command("mycave")
     async def my_cave(self, event: AstrMessageEvent):
@@ -382,9 +2318,8 @@ class CavePlugin(Star):
             yield event.plain_result(self._get_message("page_must_positive"))
             return
         
-        # 计算偏移量
-        offset = (page - 1) * self.page_size
-        ids, total = self.db.get_caves_by_sender(target_qq, self.page_size, offset)
+        # 键集分页，深页与首页代价相同
+        ids, total = await self.db.get_caves_by_sender_page(target_qq, page, self.page_size)
         
         # 检查是否有数据
         if total == 0:
@@ -429,7 +2364,7 @@ class CavePlugin(Star):
             return
         
         cave_id = int(cave_id_str)
-        row = self.db.get_cave(cave_id)
+        row = await self.db.get_cave(cave_id)
         
         if row is None:
             yield event.plain_result(self._get_message("cave_not_exist", cave_id=cave_id))
@@ -448,85 +2383,196 @@ class CavePlugin(Star):
             yield event.plain_result(self._get_message("no_permission"))
             return
         
-        if self.db.delete_cave(cave_id):
+        if await self.db.delete_cave(cave_id):
+            self._detail_cache.pop(cave_id, None)
             yield event.plain_result(self._get_message("delete_success", cave_id=cave_id))
         else:
             yield event.plain_result(self._get_message("delete_failed"))
     
     @filter.command("cf")
     async def cave_find(self, event: AstrMessageEvent):
-        """搜索回声洞"""
+        """搜索回声洞
+        
+        使用方式：
+        1. cf <关键词> -> 第1页
+        2. cf <关键词> <页码> -> 指定页（关键词最后一段为纯数字时视为页码）
+        """
         msg = event.message_str.strip()
         parts = msg.split(None, 1)
         keyword = parts[1].strip() if len(parts) > 1 else ""
+        page = 1
+        
+        args = keyword.rsplit(None, 1)
+        if len(args) == 2 and args[1].isdigit():
+            keyword, page = args[0], int(args[1])
         
         if not keyword:
             yield event.plain_result(self._get_message("search_empty_keyword"))
             return
         
-        # SQL 层直接限制结果数量
-        results = self.db.search_caves(keyword, limit=self.page_size)
+        if page <= 0:
+            yield event.plain_result(self._get_message("page_must_positive"))
+            return
+        
+        # 先取出匹配的有序 ID 列表（按关键词缓存），翻页只按主键读取当前页的正文，读到一批发送一批
+        cave_ids = await self.db.search_cave_ids(keyword, limit=self.search_max_results)
         
-        if not results:
+        if not cave_ids:
             yield event.plain_result(self._get_message("search_no_result"))
             return
         
-        chain = MessageChain().message(
-            self._get_message("search_result_header", count=len(results))
-        )
-        await self.context.send_message(event.unified_msg_origin, chain)
+        total_pages = (len(cave_ids) + self.page_size - 1) // self.page_size
+        if page > total_pages:
+            yield event.plain_result(self._get_message("search_page_out_of_range", total_pages=total_pages))
+            return
         
-        # 分批发送，每批最多 30 条
-        batch_size = 30
+        count = len(cave_ids)
+        cave_ids = cave_ids[(page - 1) * self.page_size:page * self.page_size]
+        header = self._get_message("search_result_header", count=count, page=page, total_pages=total_pages)
         
-        for i in range(0, len(results), batch_size):
-            batch = results[i:i + batch_size]
-            nodes = Nodes([])
-            
-            for r in batch:
-                # r: (cave_id, text, sender_id, group_id, group_nick, pick_count, date, is_deleted)
-                nodes.nodes.append(
-                    Node(
-                        uin=event.get_self_id(),
-                        name="回声洞",
-                        content=[Plain(
-                            self._get_message(
-                                "search_result_detail",
-                                cave_id=r[0],
-                                text=r[1],
-                                group_nick=r[4],
-                                pick_count=r[5]
-                            )
-                        )]
-                    )
-                )
-            
-            try:
-                yield event.chain_result([nodes])
-            except Exception as e:
-                logger.error(f"发送合并消息失败: {e}")
-                # 降级：逐条发送
+        async def texts():
+            async for batch in self.db.iter_caves(cave_ids, self.forward_max_nodes):
                 for r in batch:
-                    try:
-                        yield event.plain_result(
-                            self._get_message(
-                                "search_result_detail",
-                                cave_id=r[0],
-                                text=r[1],
-                                group_nick=r[4],
-                                pick_count=r[5]
-                            )
-                        )
-                        await asyncio.sleep(0.3)
-                    except Exception as send_err:
-                        logger.error(f"发送单条消息失败: {send_err}")
-            
-            # 批次间延迟
-            if i + batch_size < len(results):
-                await asyncio.sleep(0.5)
+                    # r: (cave_id, text, sender_id, group_id, group_nick, pick_count, date, is_deleted)
+                    yield self._get_message(
+                        "search_result_detail",
+                        cave_id=r[0],
+                        text=r[1],
+                        group_nick=r[4],
+                        pick_count=r[5]
+                    )
+        
+        # 标题作为第一个节点并入第一条合并消息，省去一次单独发送；送达条数只统计搜索结果
+        delivered, total, aborted = await self._send_forward(event, texts(), header)
+        if aborted:
+            # 发送通道已判定为不可用，不再发送提示
+            logger.warning(f"搜索结果发送中止：送达 {delivered}/{total} 条")
+        elif delivered < total:
+            await self.pacer.send(
+                event,
+                MessageChain().message(self._get_message("search_partial", delivered=delivered, total=total))
+            )
+    
+    async def _send_forward(self, event: AstrMessageEvent, texts, header: Optional[str] = None) -> Tuple[int, int, bool]:
+        """把异步产出的文本打包成合并转发消息依次发送，返回 (送达条数, 总条数, 是否中止)
+
+        每条合并消息不超过 forward_max_nodes 个节点，且文本总字数不超过 forward_max_chars
+        （单条文本本身超出时独占一条）。凑满一条就发送，不等待后续文本。
+        header 作为第一条合并消息的首个节点，不计入条数。
+        逐条发送放弃后不再发送后续消息，剩余文本只计入总条数。
+        """
+        pending: List[str] = []
+        size = len(header) if header else 0
+        delivered = total = 0
+        aborted = False
+        async for text in texts:
+            total += 1
+            if aborted:
+                continue
+            nodes = len(pending) + (header is not None)
+            if pending and (nodes >= self.forward_max_nodes or size + len(text) > self.forward_max_chars):
+                sent, aborted = await self._send_nodes(event, pending, header)
+                delivered += sent
+                pending, size, header = [], 0, None
+                if aborted:
+                    continue
+            pending.append(text)
+            size += len(text)
+        if (pending or header) and not aborted:
+            sent, aborted = await self._send_nodes(event, pending, header)
+            delivered += sent
+        return delivered, total, aborted
+    
+    async def _send_nodes(self, event: AstrMessageEvent, texts: List[str],
+                          header: Optional[str] = None) -> Tuple[int, bool]:
+        """发送一条合并转发消息，失败时降级为逐条发送，返回 (送达的文本条数, 是否放弃)
+
+        header 放在首个节点，不计入条数；逐条发送时省略，只发送 texts。
+        """
+        nodes = Nodes([
+            Node(uin=event.get_self_id(), name="回声洞", content=[Plain(text)])
+            for text in ([header] if header else []) + texts
+        ])
+        if await self.pacer.send(event, MessageChain([nodes])):
+            return len(texts), False
+        logger.error("发送合并消息失败，改为逐条发送")
+        return await self.fallback_sender.send_all(event, [MessageChain().message(text) for text in texts])
+    
+    @filter.command("caveimport")
+    async def cave_import(self, event: AstrMessageEvent, path: str = ""):
+        """从 v0.2 数据库导入回声洞（仅超级管理员）
+        
+        路径可以是绝对路径，也可以是相对插件数据目录的路径，例如：caveimport cave_v02.db
+        """
+        if not self._is_super_admin(int(event.get_sender_id())):
+            yield event.plain_result(self._get_message("import_no_permission"))
+            return
+        
+        path = path.strip()
+        if not path:
+            yield event.plain_result(self._get_message("import_usage"))
+            return
+        if not os.path.isabs(path):
+            path = os.path.join(self.data_dir, path)
+        if not os.path.isfile(path):
+            yield event.plain_result(self._get_message("import_not_found", path=path))
+            return
+        
+        imported = skipped = total = 0
+        next_report = 0.1
+        started = time.monotonic()
+        try:
+            async for imported, skipped, total in self.db.import_v02(path):
+                done = (imported + skipped) / total if total else 1
+                logger.info(f"导入进度: {imported + skipped}/{total}（写入 {imported}，跳过 {skipped}）")
+                # 每完成约 10% 汇报一次
+                if done >= next_report and done < 1:
+                    next_report = (int(done * 10) + 1) / 10
+                    yield event.plain_result(
+                        self._get_message("import_progress", done=imported + skipped, total=total,
+                                          percent=int(done * 100))
+                    )
+        except Exception as e:
+            logger.error(f"导入 v0.2 数据失败: {e}")
+            yield event.plain_result(self._get_message("import_failed", error=e, imported=imported))
+            return
+        
+        yield event.plain_result(
+            self._get_message("import_done", imported=imported, skipped=skipped,
+                              seconds=round(time.monotonic() - started, 1))
+        )
+    
+    @filter.command("cavestats")
+    async def cave_stats(self, event: AstrMessageEvent):
+        """查看回声洞插件的运行统计（仅超级管理员）"""
+        if not self._is_super_admin(int(event.get_sender_id())):
+            yield event.plain_result(self._get_message("stats_no_permission"))
+            return
+        
+        def ratio(m: dict) -> str:
+            return f"{m['hit_ratio'] * 100:.1f}%（命中 {m['hits']} / 未命中 {m['misses']}，缓存 {m['size']} 项）"
+        
+        detail_lookups = self.detail_cache_hits + self.detail_cache_misses
+        search = self.db.search_cache_metrics()
+        executor = self.db.metrics()
+        lines = [
+            f"回声洞总数：{await self.db.get_live_count()}",
+            f"搜索缓存：{ratio(search)}，过期丢弃 {search['stale']} 次，写入代数 {search['generation']}",
+            f"行缓存：{ratio(self.db.row_cache_metrics())}",
+            f"回复缓存：{(self.detail_cache_hits / detail_lookups if detail_lookups else 0.0) * 100:.1f}%"
+            f"（命中 {self.detail_cache_hits} / 未命中 {self.detail_cache_misses}，缓存 {len(self._detail_cache)} 项）",
+            f"群名称缓存：{ratio(self.group_names.metrics())}",
+            f"数据库线程池：排队 {executor['queue_depth']}，平均等待 {executor['avg_wait_ms']:.2f} ms，"
+            f"最长等待 {executor['max_wait_ms']:.2f} ms",
+            f"批量发送：成功 {self.pacer.sent}，失败 {self.pacer.failed}",
+        ]
+        yield event.plain_result("\n".join(lines))
     
     async def terminate(self):
         """插件卸载时的清理工作"""
-        pass
+        for task in self._background_tasks:
+            task.cancel()
+        await asyncio.gather(*self._background_tasks, return_exceptions=True)
+        await self.db.close()
 
 